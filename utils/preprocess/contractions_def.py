@@ -3,6 +3,8 @@
 
 import re
 
+from special_words import words_pattern
+
 # added twitter specific contractions
 contractions_dict = {
     "ain't": "are not",
@@ -136,7 +138,6 @@ contractions_dict = {
     "somethin'": "something"
 }
 
-contractions_re_keys = [x.replace("'", "['’]") for x in contractions_dict]
 contractions_dict.update({k.replace("'", "’"): v for k, v in contractions_dict.items()})
 
 leftovers_dict = {
@@ -169,47 +170,100 @@ slang = {
 
 unsafe_dict.update(slang)
 
-leftovers_re = re.compile('|'.join(sorted(leftovers_dict.keys())), re.IGNORECASE)
-contractions_re = re.compile('|'.join(sorted(contractions_re_keys)), re.IGNORECASE)
-unsafe_re = re.compile(r"\b" + r"\b|\b".join(sorted(unsafe_dict)) + r"\b", re.IGNORECASE)
 
+class ContractionsEngine:
+    """
+        Expand the contractions, then the leftovers, then the slang and unsafe
+        words (only as whole words) of a text
+
+        Each table is matched with one pattern shaped like a trie of its words
+        (see special_words.py). The passes keep the order of the substitutions
+        they replace: each pass rewrites the output of the previous one and
+        the shortest word of a position is taken, like with the alternation of
+        the sorted words. Each apostrophe of a contraction matches both ' and ’,
+        the leftovers and unsafe words are matched as written in their table.
+
+        Ex.:
+        contractions_engine.fix("I can't go, u know")
+        >> 'I cannot go, you know'
+    """
+
+    def __init__(self, contractions, leftovers, unsafe):
+        self.tables = {"contractions": contractions, "leftovers": leftovers, "unsafe": unsafe}
+        self.replacers = {name: self._replacer(table) for name, table in self.tables.items()}
+        self.patterns = {}
+
+    @staticmethod
+    def _escape(char):
+        return "['’]" if char == "'" else re.escape(char)
 
-def _replacer(dc):
-    def replace(match):
-        v = match.group()
-        if v in dc:
-            return dc[v]
-        v = v.lower()
-        if v in dc:
-            return dc[v]
-        return v
+    @staticmethod
+    def _replacer(table):
+        def replace(match):
+            v = match.group()
+            try:
+                return table[v]
+            except KeyError:
+                v = v.lower()
+                return table.get(v, v)
 
-    return replace
+        return replace
 
+    def pattern(self, name):
+        """ Return the pattern of the table ("contractions", "leftovers", "unsafe"), compiled on first use """
+        pattern = self.patterns.get(name)
+        if pattern is None:
+            if name == "contractions":
+                # each apostrophe matching both ' and ’
+                words = set(k.replace("’", "'") for k in self.tables[name])
+                escape = self._escape
+            else:
+                # the words as they are, ex. "he’d’ve" of unsafe is not matched by "he'd've"
+                words, escape = self.tables[name], re.escape
+            pattern = words_pattern(sorted(words), escape, shortest=True)
+            if name == "unsafe":
+                pattern = r"\b(?:" + pattern + r")\b"
+            pattern = self.patterns[name] = re.compile(pattern, re.IGNORECASE)
+        return pattern
 
-slang_re = re.compile(r"\b" + r"\b|\b".join(sorted(list(slang) +
-                                                   list(unsafe_dict))) + r"\b", re.IGNORECASE)
+    def passes(self, leftovers=True, slang=True):
+        """ Return the list of the passes (pattern, function(match) -> replacement) of the given options """
+        names = ["contractions"] + (["leftovers"] if leftovers else []) + (["unsafe"] if slang else [])
+        return [(self.pattern(name), self.replacers[name]) for name in names]
 
-LIM_RE = re.compile("['’]")
+    def fix(self, s, leftovers=True, slang=True):
+        """ Expand the contractions (and leftovers, slang) of a text """
+        # ensure str like expected from re.sub
+        s = str(s)
+        for pattern, replace in self.passes(leftovers, slang):
+            s = pattern.sub(replace, s)
+        return s
 
-rc = _replacer(contractions_dict)
-rl = _replacer(leftovers_dict)
-ru = _replacer(unsafe_dict)
+    def fix_batch(self, texts, leftovers=True, slang=True, separator="\x00"):
+        """
+            Expand the contractions of a list of texts with one scan per pass over
+            the texts joined by separator, a character which is neither in a text
+            nor in a contraction
+
+            Return
+            ---------------------------------------------------------------
+            list of texts, identical to [fix(text) for text in texts]
+        """
+        texts = [str(s) for s in texts]
+        if not texts:
+            return []
+        joined = separator.join(texts)
+        if joined.count(separator) != len(texts) - 1:  # separator in a text
+            return [self.fix(s, leftovers, slang) for s in texts]
+        return self.fix(joined, leftovers, slang).split(separator)
+
+
+contractions_engine = ContractionsEngine(contractions_dict, leftovers_dict, unsafe_dict)
 
 
 def contractions_fix(s, leftovers=True, slang=True):
-    # when not expecting a lot of matches, this will be 30x faster
-    # otherwise not noticeably slower even in benchmarks
-    if not LIM_RE.search(s):
-        if slang and slang_re.search(s):
-            pass
-        else:
-            # ensure str like expected from re.sub
-            return str(s)
-    s = contractions_re.sub(rc, s)
-    if leftovers:
-        s = leftovers_re.sub(rl, s)
-    if slang:
-        s = unsafe_re.sub(ru, s)
-
-    return s
+    return contractions_engine.fix(s, leftovers, slang)
+
+
+def contractions_fix_batch(texts, leftovers=True, slang=True):
+    return contractions_engine.fix_batch(texts, leftovers, slang)
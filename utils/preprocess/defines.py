@@ -9,26 +9,58 @@ Inspired by https://github.com/s/preprocessor/tree/master/preprocessor
 
 - 24/08/2018 : Added Emotion terms
 
+The heavy definitions (NLTK stopwords, stemmers and lemmatizer, emoticon pattern,
+WordNet synonyms of the emotions) are created on first access, so that importing
+this module neither loads NLTK nor downloads anything. NLTK data is downloaded
+once with download_nltk_data(), warmup() creates all definitions up front.
+
 Editor: Hanin Ayadi
 Last editing date: 21/07/2022
 """
 
 import re
-import nltk
-from nltk.stem import LancasterStemmer, PorterStemmer, SnowballStemmer, WordNetLemmatizer
-from nltk.corpus import stopwords
-
-# download library
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
 
-from emotion_codes import EMOTICONS_UNICODE
 from stopword_def import *
 
 from emotionKeywords import *
-from emotion_codes import *
 from stopwords_fr import *
+from special_words import SpecialWords
+from emotion_synonyms import load_emotion_synonyms
+
+# NLTK data used by the preprocessing, see download_nltk_data
+NLTK_DATA = ['punkt', 'stopwords', 'wordnet', 'averaged_perceptron_tagger']
+
+
+def download_nltk_data():
+    """ Download the NLTK data used by the preprocessing, to be run once per machine """
+    import nltk
+    for name in NLTK_DATA:
+        nltk.download(name)
+
+
+class lazy:
+    """
+        Class attribute created by the decorated function on its first access,
+        and then stored in the class
+
+        Ex.:
+        class Grammar:
+            @lazy
+            def STEMMER_SNOWBALL_EN():
+                return SnowballStemmer('english')
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.name = function.__name__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        value = self.function()
+        setattr(owner, self.name, value)
+        return value
 
 
 class Constants:
@@ -47,22 +79,58 @@ class Patterns:
     HASHTAG_PATTERN = re.compile(r"#(\w+)")
     RESERVED_WORDS_PATTERN = re.compile(r'^(RT|FAV)')  # TODO check for this
 
-    EMOTICONS_PATTERN = re.compile(u'(' + u'|'.join(k for k in EMOTICONS_UNICODE) + u')', re.IGNORECASE)
+    @lazy
+    def EMOTICONS_PATTERN():
+        from emotion_tables import EMOTICONS_UNICODE
+        return re.compile(u'(' + u'|'.join(k for k in EMOTICONS_UNICODE) + u')', re.IGNORECASE)
     # TODO create EMOJI PATTERN
 
 
 class Grammar:
-    STOPWORDS_EN = stopwords.words('english')
+    @lazy
+    def STOPWORDS_EN():
+        from nltk.corpus import stopwords
+        return stopwords.words('english')
+
     STOPWORDS_NO_PERSONAL_EN = stopwords_no_personal_list  # excludes personal words like "I", "me", "my" to keep them when filtering personal from institutional tweets
     STOPWORDS_CUSTOM = stopwords_custom_list
     STOPWORDS_FR = stopwords_fr
     WHITELIST_EN = ["n't", "not", "no", "nor", "never", "nothing", "nowhere", "noone", "none"]
-    STEMMER_LANCASTER = LancasterStemmer()  # aggressive, fast, sometimes confusing
+
+    # sets of the words removed by Preprocess.remove_stopwords for each option
+    # (include_personal_words, include_negations), negations are kept by removing the whitelist
+    @lazy
+    def STOPWORD_SETS_EN():
+        return {
+            (False, False): frozenset(Grammar.STOPWORDS_EN + Grammar.STOPWORDS_CUSTOM),
+            (True, False): frozenset(Grammar.STOPWORDS_NO_PERSONAL_EN + Grammar.STOPWORDS_CUSTOM),
+            (False, True): frozenset(Grammar.STOPWORDS_EN + Grammar.STOPWORDS_CUSTOM) - frozenset(Grammar.WHITELIST_EN),
+            (True, True): frozenset(Grammar.STOPWORDS_NO_PERSONAL_EN + Grammar.STOPWORDS_CUSTOM) - frozenset(Grammar.WHITELIST_EN)
+        }
+
+    STOPWORD_SET_FR = frozenset(STOPWORDS_FR)
+
+    @lazy
+    def STEMMER_LANCASTER():  # aggressive, fast, sometimes confusing
+        from nltk.stem import LancasterStemmer
+        return LancasterStemmer()
+
     #    STEMMER_PORTER = PorterStemmer(mode='NLTK_EXTENSIONS') # mode that includes further improvements
-    STEMMER_SNOWBALL_EN = SnowballStemmer('english')  # improved porter
-    STEMMER_SNOWBALL_FR = nltk.stem.snowball.FrenchStemmer()
 
-    LEMMATIZER = WordNetLemmatizer()
+    @lazy
+    def STEMMER_SNOWBALL_EN():  # improved porter
+        from nltk.stem import SnowballStemmer
+        return SnowballStemmer('english')
+
+    @lazy
+    def STEMMER_SNOWBALL_FR():
+        from nltk.stem.snowball import FrenchStemmer
+        return FrenchStemmer()
+
+    @lazy
+    def LEMMATIZER():
+        from nltk.stem import WordNetLemmatizer
+        return WordNetLemmatizer()
 
 
 class WordLists:
@@ -70,9 +138,11 @@ class WordLists:
                  "covid long", "covid_long", "covid-long", "mitcoronaleben", "langzeitcovid", "koronaoire"]
     covid = ["covid-nineteen", "corona"]
     longterm = ["long-term"]
-    LONGCOVID_WORDS = re.compile(u"|".join(longcovid))
-    COVID_WORDS = re.compile(u"|".join(covid))
-    LONGTERM_WORDS = re.compile(u"|".join(longterm))
+    # all special words replaced in one pass by Preprocess.replace_special_words,
+    # other lists can be added at runtime with SPECIAL_WORDS.add(words, replacement)
+    SPECIAL_WORDS = SpecialWords({Constants.LONGCOVID: longcovid,
+                                  Constants.COVID: covid,
+                                  Constants.LONGTERM: longterm})
 
     excludeTweets = []  # list with words whose tweets are to be excluded
 
@@ -85,13 +155,25 @@ class Emotions:
 
     parrotsEmotions = get_parrotsEmotions_list_all()
     allEmotions = get_parrotsEmotions_list_all() + DDS_list + PAID_list
-    allEmotions_allForms_synonyms = get_synonyms(all_word_forms(allEmotions),
-                                                 excludeSynonyms_, addWords_)
+
     # list with all emotions and their synonyms (deleted some which were clearly not an emotion)
     emotions_full_list = emotion_key_words_fulllist
 
+    # WordNet expansion of the emotions, loaded from the artifact of emotion_synonyms.py
+    @lazy
+    def synonyms_artifact():
+        return load_emotion_synonyms(Emotions.excludeSynonyms_, Emotions.addWords_,
+                                     Emotions.emotions_full_list)
+
+    @lazy
+    def allEmotions_allForms_synonyms():
+        return Emotions.synonyms_artifact["all"]
+
     def get_emotion_synonyms(emotion, excludeWords=excludeSynonyms_, addWords=addWords_,
                              all_emotions_list=emotions_full_list):
+        if excludeWords is Emotions.excludeSynonyms_ and addWords is Emotions.addWords_ and \
+                all_emotions_list is Emotions.emotions_full_list:
+            return list(Emotions.synonyms_artifact["emotions"][emotion])
         return list(set(get_synonyms(all_word_forms(get_parrotsEmotions_for_emtion(emotion)),
                                      excludeWords, addWords))
                     & set(all_emotions_list))
@@ -111,7 +193,23 @@ class Emotions:
     #    emotions_synonyms_sadness = get_emotion_synonyms("sadness")
     #    emotions_synonyms_fear = get_emotion_synonyms("fear")
 
-    EMOTION_CATEGORIES = Emotions_positive.CATEGORIES_POSITIVE + Emotions_negative.CATEGORES_NEGATIVE
+    # categories of emotion_codes.Emotions_positive and Emotions_negative
+    @lazy
+    def EMOTION_CATEGORIES():
+        from emotion_tables import CATEGORIES_POSITIVE, CATEGORIES_NEGATIVE
+        return CATEGORIES_POSITIVE + CATEGORIES_NEGATIVE
+
+
+def warmup():
+    """
+        Create all the lazy definitions of Patterns, Grammar, WordLists and Emotions
+        at once, for services which prefer to pay the loading time at startup
+    """
+    for definitions in (Constants, Patterns, Grammar, WordLists, Emotions):
+        for name, value in list(vars(definitions).items()):
+            if isinstance(value, lazy):
+                getattr(definitions, name)
+    WordLists.SPECIAL_WORDS.pattern
 
 
 ColumnNames = {
@@ -0,0 +1,233 @@
+"""
+Codepoint trie over the emojis of emotion_codes.EMOJI_UNICODE
+
+Each emoji (including multi-codepoint sequences: skin tones, flags, ZWJ
+sequences) is a path in the trie, whose end holds the emoji name and its
+emotion categories split once, ex. ('EMOT_SURPRISE', 'EMOT_FEAR').
+Emojis are replaced by their emotion categories in one scan over the raw
+text or over the tokens, taking the longest emoji at each position.
+
+Ex.:
+trie = default_emoji_trie()
+trie.replace_text("so tired 😭😭 but ❤️")
+>> 'so tired  EMOT_SADNESS  EMOT_SADNESS  but  EMOT_LOVE '
+"""
+
+import re
+
+from special_words import words_pattern
+
+# key of the trie node holding the emoji ending at that node
+_END = ""
+
+# characters modifying the previous emoji, dropped when they are not part of a
+# known sequence: variation selectors, zero width joiner, skin tones
+EMOJI_MODIFIERS = frozenset(["\ufe0e", "\ufe0f", "\u200d", "\u20e3"] +
+                            [chr(code) for code in range(0x1F3FB, 0x1F400)])
+
+
+class EmojiTrie:
+    """
+        Parameters
+        -------------------------------------------------------
+        emoji_unicode :     dict emoji name -> unicode, codepoints separated by spaces
+                            (emotion_codes.EMOJI_UNICODE)
+        emoji_to_category : dict emoji name -> emotion categories separated by spaces,
+                            "" if the emoji has no category (emotion_codes.EMOJI_TO_CATEGORY)
+    """
+
+    def __init__(self, emoji_unicode, emoji_to_category):
+        self.root = {}
+        self.emojis = {}  # emoji -> (name, category string, tuple of categories)
+        self._pattern = None
+        for name, code in emoji_unicode.items():
+            category = emoji_to_category.get(name, "")
+            node = self.root
+            for char in code.replace(" ", ""):
+                node = node.setdefault(char, {})
+            # (name, category string, tuple of categories)
+            node[_END] = (name, category, tuple(category.split(" ")) if category else ())
+            self.emojis[code.replace(" ", "")] = node[_END]
+
+        self.first_chars = frozenset(self.root)
+        self.first_char_pattern = re.compile(
+            "[" + "".join(re.escape(char) for char in sorted(self.first_chars)) + "]")
+
+    def match(self, text, start=0):
+        """
+            Return (end, (name, category, categories)) of the longest emoji
+            starting at text[start], None if there is no emoji
+        """
+        node = self.root
+        found = None
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            entry = node.get(_END)
+            if entry is not None:
+                found = (i + 1, entry)
+        if found is None:
+            return None
+
+        # skip the modifiers following the emoji which are not part of the table
+        end = found[0]
+        while end < len(text) and text[end] in EMOJI_MODIFIERS:
+            end += 1
+        return end, found[1]
+
+    @property
+    def pattern(self):
+        """
+            Pattern matching the longest emoji at a position and the modifiers
+            following it like match, the emoji being its group 1. Compiled on first use
+        """
+        if self._pattern is None:
+            self._pattern = re.compile("(" + words_pattern(self.emojis) + ")[" +
+                                       "".join(re.escape(char) for char in sorted(EMOJI_MODIFIERS)) + "]*")
+        return self._pattern
+
+    def replace_match(self, match):
+        """ Return the replacement of replace_text (without limit_nEmojis) of a match of pattern """
+        category = self.emojis[match.group(1)][1]
+        return " " + category + " " if category else " "
+
+    def split_token(self, token):
+        """
+            Return the list of emoji entries (name, category, categories) the token
+            is made of, None if the token is not only made of emojis.
+            A token only made of modifiers (ex. a variation selector split from its
+            emoji by the tokenizer) gives an empty list.
+        """
+        if not token:
+            return None
+        if token[0] not in self.first_chars:
+            if all(char in EMOJI_MODIFIERS for char in token):
+                return []
+            return None
+
+        entries = []
+        start = 0
+        while start < len(token):
+            matched = self.match(token, start)
+            if matched is None:
+                return None
+            start, entry = matched
+            entries.append(entry)
+        return entries
+
+    def replace_tokens(self, tokens, limit_nEmojis=False, on_missing_category=None):
+        """
+            Replace the emojis of a list of tokens by their emotion categories
+
+            Parameters
+            -------------------------------------------------------
+            tokens :              list of tokens
+            limit_nEmojis :       maximum number of emojis of the same emotion category
+                                  kept in the text, if False all emojis are kept and the categories
+                                  of a token are joined in one token, ex. 'EMOT_SURPRISE EMOT_FEAR'
+            on_missing_category : function(token, name) called for emojis without category,
+                                  which are deleted
+        """
+        emot_counter = {}
+        clean_tokens = []
+        for token in tokens:
+            if not token or (token[0] not in self.first_chars and token[0] not in EMOJI_MODIFIERS):
+                clean_tokens.append(token)
+                continue
+
+            entries = self.split_token(token)
+            if entries is None:
+                clean_tokens.append(token)
+                continue
+
+            if limit_nEmojis is False:
+                category = self._join_categories(token, entries, on_missing_category)
+                if category:
+                    clean_tokens.append(category)
+                continue
+
+            for name, category, categories in entries:
+                if not categories and on_missing_category is not None:
+                    on_missing_category(token, name)
+                for emo in categories:
+                    emot_counter[emo] = emot_counter.get(emo, 0) + 1
+                    if emot_counter[emo] <= limit_nEmojis:
+                        clean_tokens.append(emo)
+        return clean_tokens
+
+    def replace_token(self, token, on_missing_category=None):
+        """
+            Return the emotion categories of a token made of emojis joined in one
+            token, None if all its emojis have no category, the token itself if
+            it is not made of emojis
+        """
+        if not token or (token[0] not in self.first_chars and token[0] not in EMOJI_MODIFIERS):
+            return token
+
+        entries = self.split_token(token)
+        if entries is None:
+            return token
+        return self._join_categories(token, entries, on_missing_category) or None
+
+    def _join_categories(self, token, entries, on_missing_category):
+        if len(entries) == 1 and entries[0][1]:  # most frequent case, a single emoji
+            return entries[0][1]
+
+        categories = []
+        for name, category, _ in entries:
+            if category:
+                categories.append(category)
+            elif on_missing_category is not None:
+                on_missing_category(token, name)
+        return " ".join(categories)
+
+    def replace_text(self, text, limit_nEmojis=False):
+        """
+            Replace the emojis of a raw text by their emotion categories, surrounded
+            by spaces so that they are separate tokens. Emojis without category are deleted.
+
+            limit_nEmojis : maximum number of emojis of the same emotion category
+                            kept in the text, if False all emojis are kept
+        """
+        emot_counter = {}
+        pieces = []
+        last = 0
+        search = self.first_char_pattern.search
+        candidate = search(text)
+        while candidate is not None:
+            start = candidate.start()
+            matched = self.match(text, start)
+            if matched is None:
+                candidate = search(text, start + 1)
+                continue
+
+            end, (name, category, categories) = matched
+            pieces.append(text[last:start])
+            kept = []
+            for emo in categories:
+                if limit_nEmojis is not False:
+                    emot_counter[emo] = emot_counter.get(emo, 0) + 1
+                    if emot_counter[emo] > limit_nEmojis:
+                        continue
+                kept.append(emo)
+            pieces.append(" " + " ".join(kept) + " " if kept else " ")
+            last = end
+            candidate = search(text, end)
+
+        if not pieces:
+            return text
+        pieces.append(text[last:])
+        return "".join(pieces)
+
+
+_default_emoji_trie = None
+
+
+def default_emoji_trie():
+    """ Return the trie of the emojis of emotion_codes, built once on first use """
+    global _default_emoji_trie
+    if _default_emoji_trie is None:
+        from emotion_tables import EMOJI_UNICODE, EMOJI_TO_CATEGORY
+        _default_emoji_trie = EmojiTrie(EMOJI_UNICODE, EMOJI_TO_CATEGORY)
+    return _default_emoji_trie
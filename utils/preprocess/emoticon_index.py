@@ -0,0 +1,120 @@
+"""
+Hash index of the emoticons of emotion_codes
+
+Replacing emoticons by searching every token with the alternation of all
+emoticon patterns is slow, while most tokens are plain words. The index answers
+most tokens with dictionary lookups:
+- exact : the emoticons of EMOTICONS with their result precomputed with the pattern
+- normalized : the same emoticons in lowercase, so that ":p" is replaced like ":P",
+  for the emoticons whose case variants all give the same category (the other
+  case variants are searched with the pattern)
+- tokens without any of the punctuation characters used in emoticons cannot
+  contain an emoticon giving another result than the token itself
+Only the remaining tokens are searched with the pattern.
+
+Ex.:
+index = default_emoticon_index()
+[index.replace_token(word) for word in ["so", "tired", ":(", ":p"]]
+>> ['so', 'tired', 'EMOT_SADNESS', 'EMOT_JOY']
+"""
+
+import re
+import sys
+
+# marks a token missing from the exact index, None meaning a deleted token,
+# and in the normalized index a token to search with the pattern
+_MISSING = object()
+
+
+class EmoticonIndex:
+    """
+        Parameters
+        -------------------------------------------------------
+        emoticons_unicode : dict emoticon pattern -> category (emotion_codes.EMOTICONS_UNICODE)
+        emoticons :         dict emoticon -> category (emotion_codes.EMOTICONS)
+    """
+
+    def __init__(self, emoticons_unicode, emoticons):
+        self.emoticons = emoticons
+        self.pattern = re.compile(u'(' + u'|'.join(k for k in emoticons_unicode) + u')', re.IGNORECASE)
+
+        self.exact = {word: self.match_pattern(word) for word in emoticons}
+        # the category of a lowercase key only when all its case variants give the
+        # same category, otherwise (ex. "dx" EMOT_JOY and "DX" EMOT_FEAR) the other
+        # case variants are searched with the pattern
+        variants = {}
+        for word, result in self.exact.items():
+            variants.setdefault(word.lower(), []).append((word, result))
+        self.normalized = {}
+        for lower, words in variants.items():
+            results = {result for _, result in words}
+            if len(results) == 1 and all(result is not None and result != word for word, result in words):
+                self.normalized[lower] = words[0][1]
+            else:
+                self.normalized[lower] = _MISSING
+        self.max_length = max((len(word) for word in self.normalized), default=0)
+
+        # non alphanumeric characters of the (unescaped) patterns: a token without
+        # them is either an emoticon of the index or kept as it is
+        unescaped_patterns = [re.sub(r'\\(.)', r'\1', k) for k in emoticons_unicode]
+        self.prefilter_chars = frozenset(char for pattern in unescaped_patterns
+                                         for char in pattern if not char.isalnum())
+
+    def match_pattern(self, word):
+        """
+            Replace the emoticon of a token by searching for the emoticon patterns
+
+            Return
+            ---------------------------------------------------------------
+            the category if the token is an emoticon, the token if it only contains
+            an emoticon, None if the token is to be deleted
+        """
+        match_emoticon = self.pattern.findall(word)
+        if not match_emoticon:  # if no emoticon found
+            return word
+        if match_emoticon[0] != ':':
+            if match_emoticon[0] != word:
+                return word
+            try:
+                return self.emoticons[word]
+            except KeyError:
+                print("INFO: Could not replace emoticon: {} of the word: {}".format(match_emoticon[0],
+                                                                                    word),
+                      sys.exc_info())
+        return None
+
+    def replace_token(self, word, match_pattern=None):
+        """
+            Return the category of an emoticon token, None if the token is to be
+            deleted and the token itself otherwise
+
+            match_pattern : function used for the tokens searched with the pattern,
+                            ex. a cached version of self.match_pattern
+        """
+        result = self.exact.get(word, _MISSING)
+        if result is not _MISSING:
+            return result
+
+        if len(word) <= self.max_length:
+            result = self.normalized.get(word.lower())
+            if result is _MISSING:
+                return (match_pattern or self.match_pattern)(word)
+            if result is not None:
+                return result
+
+        if self.prefilter_chars.isdisjoint(word):
+            return word
+
+        return (match_pattern or self.match_pattern)(word)
+
+
+_default_emoticon_index = None
+
+
+def default_emoticon_index():
+    """ Return the index of the emoticons of emotion_codes, built once on first use """
+    global _default_emoticon_index
+    if _default_emoticon_index is None:
+        from emotion_tables import EMOTICONS_UNICODE, EMOTICONS
+        _default_emoticon_index = EmoticonIndex(EMOTICONS_UNICODE, EMOTICONS)
+    return _default_emoticon_index
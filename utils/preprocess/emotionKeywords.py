@@ -11,9 +11,6 @@ Keywords taken from:
 - Parrots Classification of Emotions (2001) : https://www.theemotionmachine.com/classification-of-emotions/
 """
 
-from nltk.corpus import wordnet
-from word_forms.word_forms import get_word_forms
-
 PAID_list = ["discouraged", "scared", "uncomfortable", "deprivation", "depression",
              "mood", "feeling", "overwhelmed", "worrying", "angry", "concerned",
              "guilty", "anxiety", "unacceptable", "unsatisfied", "alone",
@@ -139,6 +136,8 @@ def all_word_forms(wordlist):
         wordlist:       list of words
     """
 
+    from word_forms.word_forms import get_word_forms  # loads WordNet
+
     list_all = []
     for word in wordlist:
         list_all.append(word)
@@ -158,6 +157,8 @@ def get_synonym(word):
         Get synonyms of the given word using wordnet
     """
 
+    from nltk.corpus import wordnet
+
     syns = wordnet.synsets(word)
     return list(set([l.name() for s in syns for l in s.lemmas()]))
 
@@ -178,20 +179,11 @@ def get_synonyms(wordlist, excludeSynonyms, addWords):
     for word in wordlist:
         list_all.extend(get_synonym(word))
 
-    list_all = list(set(list_all))
-
     # exclude certain words
-    for word in excludeSynonyms:
-        try:
-            list_all.remove(word)
-            #print("excluded {}".format(word))
-        except:
-            #print("Info: Could not exclude {}".format(word))
-            pass
+    list_all = list(set(list_all) - set(excludeSynonyms))
 
     # add certain words
-    for word in addWords:
-        list_all.append(word)
+    list_all.extend(addWords)
 
     return list_all
 
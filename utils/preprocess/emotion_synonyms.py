@@ -0,0 +1,107 @@
+"""
+Build-time artifact of the WordNet expansion of the emotion words
+
+Expanding the Parrot, DDS and PAID emotion lists to all their word forms and
+WordNet synonyms takes minutes. The expansion is built once into a small json
+file holding:
+- all : synonyms of all word forms of all emotions (Emotions.allEmotions_allForms_synonyms)
+- emotions : synonyms of each primary emotion kept in the full emotion list
+             (Emotions.get_emotion_synonyms)
+The file stores the checksum of its sources (emotion tree and lists, excluded
+and added words, version of the format) and is built again on load when they change.
+
+Build the artifact (ex. when packaging the workers):
+python emotion_synonyms.py [path]
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+# version of the artifact format, changing it forces a rebuild
+ARTIFACT_VERSION = 1
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_synonyms.json")
+
+
+def _sources(exclude_words, add_words, all_emotions_list):
+    from emotionKeywords import ParrotsEmotionsTree, DDS_list, PAID_list
+    return {"version": ARTIFACT_VERSION,
+            "ParrotsEmotionsTree": ParrotsEmotionsTree,
+            "DDS_list": DDS_list,
+            "PAID_list": PAID_list,
+            "exclude_words": sorted(exclude_words),
+            "add_words": list(add_words),
+            "all_emotions_list": sorted(all_emotions_list)}
+
+
+def sources_checksum(exclude_words, add_words, all_emotions_list):
+    """ Return the sha256 of the sources of the expansion """
+    sources = json.dumps(_sources(exclude_words, add_words, all_emotions_list), sort_keys=True)
+    return hashlib.sha256(sources.encode("utf-8")).hexdigest()
+
+
+def build_emotion_synonyms(exclude_words, add_words, all_emotions_list):
+    """
+        Expand the emotion words through their word forms and WordNet
+
+        Return
+        ---------------------------------------------------------------
+        dict with the version, the checksum of the sources, the list of all
+        synonyms ("all") and the synonyms of each primary emotion ("emotions")
+    """
+    from emotionKeywords import (ParrotsEmotionsTree, DDS_list, PAID_list, all_word_forms,
+                                 get_parrotsEmotions_list_all, get_parrotsEmotions_for_emtion,
+                                 get_synonyms)
+
+    all_emotions = get_parrotsEmotions_list_all() + DDS_list + PAID_list
+    all_emotions_set = set(all_emotions_list)
+    emotions = {}
+    for emotion in ParrotsEmotionsTree:
+        synonyms = get_synonyms(all_word_forms(get_parrotsEmotions_for_emtion(emotion)),
+                                exclude_words, add_words)
+        emotions[emotion] = sorted(set(synonyms) & all_emotions_set)
+
+    return {"version": ARTIFACT_VERSION,
+            "checksum": sources_checksum(exclude_words, add_words, all_emotions_list),
+            "all": sorted(set(get_synonyms(all_word_forms(all_emotions), exclude_words, add_words))),
+            "emotions": emotions}
+
+
+def save_emotion_synonyms(artifact, path=DEFAULT_PATH):
+    """ Write the artifact, replacing the previous file at once """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_emotion_synonyms(exclude_words, add_words, all_emotions_list, path=DEFAULT_PATH):
+    """
+        Return the artifact of the given sources stored at path, built and saved
+        first if the file is missing or was built from other sources
+    """
+    checksum = sources_checksum(exclude_words, add_words, all_emotions_list)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("version") == ARTIFACT_VERSION and artifact.get("checksum") == checksum:
+            return artifact
+
+    artifact = build_emotion_synonyms(exclude_words, add_words, all_emotions_list)
+    try:
+        save_emotion_synonyms(artifact, path)
+    except OSError as e:  # read-only installation, the expansion is kept in memory
+        print("INFO: Could not save the emotion synonyms to {}: {}".format(path, e))
+    return artifact
+
+
+if __name__ == "__main__":
+    from defines import Emotions
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    artifact = build_emotion_synonyms(Emotions.excludeSynonyms_, Emotions.addWords_,
+                                      Emotions.emotions_full_list)
+    save_emotion_synonyms(artifact, path)
+    print("Saved {} synonyms to {}".format(len(artifact["all"]), path))
@@ -0,0 +1,105 @@
+"""
+Fast loading snapshot of the tables of emotion_codes.py
+
+emotion_codes.py stays the editable source of the emoticon and emoji tables,
+but executing it in every process is slow. Its tables are compiled into a
+marshal snapshot next to it, each table being decoded only on its first access:
+
+from emotion_tables import EMOJI_UNICODE, EMOJI_TO_CATEGORY
+
+The snapshot stores the checksum of emotion_codes.py and is built again on
+load when the source changed. It can also be built beforehand (ex. when
+packaging the workers):
+python emotion_tables.py
+"""
+
+import hashlib
+import marshal
+import os
+
+# version of the snapshot format, changing it forces a rebuild
+SNAPSHOT_VERSION = 1
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_codes.py")
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_codes.marshal")
+
+# tables of emotion_codes stored in the snapshot
+TABLES = ("EMOTICONS_UNICODE", "EMOTICONS", "EMOJI_UNICODE", "EMOJI_TO_CATEGORY",
+          "CATEGORIES_POSITIVE", "CATEGORIES_NEGATIVE")
+
+# encoded tables of the loaded snapshot
+_snapshot = None
+
+
+def source_checksum(source_path=SOURCE_PATH):
+    """ Return the sha256 of emotion_codes.py """
+    with open(source_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_snapshot(source_path=SOURCE_PATH):
+    """ Return the snapshot of the tables of emotion_codes, each table encoded separately """
+    import emotion_codes
+
+    tables = {name: getattr(emotion_codes, name) for name in TABLES[:4]}
+    tables["CATEGORIES_POSITIVE"] = emotion_codes.Emotions_positive.CATEGORIES_POSITIVE
+    tables["CATEGORIES_NEGATIVE"] = emotion_codes.Emotions_negative.CATEGORES_NEGATIVE
+    return {"version": SNAPSHOT_VERSION,
+            "marshal_version": marshal.version,
+            "checksum": source_checksum(source_path),
+            "tables": {name: marshal.dumps(table) for name, table in tables.items()}}
+
+
+def save_snapshot(snapshot, path=SNAPSHOT_PATH):
+    """ Write the snapshot, replacing the previous file at once """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        marshal.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path=SNAPSHOT_PATH, source_path=SOURCE_PATH):
+    """
+        Return the snapshot stored at path, built from emotion_codes.py and saved
+        first if the file is missing or older than the source
+    """
+    checksum = source_checksum(source_path)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            try:
+                snapshot = marshal.load(f)
+            except (EOFError, ValueError, TypeError):  # truncated or other python version
+                snapshot = {}
+        if snapshot.get("version") == SNAPSHOT_VERSION and \
+                snapshot.get("marshal_version") == marshal.version and \
+                snapshot.get("checksum") == checksum:
+            return snapshot
+
+    snapshot = build_snapshot(source_path)
+    try:
+        save_snapshot(snapshot, path)
+    except OSError as e:  # read-only installation, the snapshot is kept in memory
+        print("INFO: Could not save the snapshot of the emotion tables to {}: {}".format(path, e))
+    return snapshot
+
+
+def __getattr__(name):
+    """ Decode the tables on their first access """
+    global _snapshot
+    if name in TABLES:
+        if _snapshot is None:
+            _snapshot = load_snapshot()
+        value = marshal.loads(_snapshot["tables"][name])
+    elif name == "UNICODE_EMOJI":
+        # inverse dictionary with unicodes as keys
+        emoji_unicode = globals().get("EMOJI_UNICODE") or __getattr__("EMOJI_UNICODE")
+        value = {v: k for k, v in emoji_unicode.items()}
+    else:
+        raise AttributeError("module {} has no attribute {}".format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+if __name__ == "__main__":
+    save_snapshot(build_snapshot())
+    print("Saved the snapshot of {} to {}".format(SOURCE_PATH, SNAPSHOT_PATH))
@@ -0,0 +1,133 @@
+"""
+Fast tokenizer giving the same tokens as nltk's TweetTokenizer
+
+TweetTokenizer unescapes the html entities of the whole text and searches
+every token with its large regex (urls, phone numbers, emoticons, ...).
+Most chunks of a post between two spaces are plain words (letters, possibly
+joined by apostrophes or dashes like "can't"), whose only token is the chunk
+itself, or a plain word followed by a punctuation mark. FastTweetTokenizer
+takes these chunks as they are and runs TweetTokenizer once per text on the
+other chunks only, which gives the same tokens since no token of
+TweetTokenizer spans a plain word and a space (only phone numbers and
+ellipsis dots contain spaces, and they are kept together).
+
+Ex.:
+tokenizer = FastTweetTokenizer()
+tokenizer.tokenize("I can't sleep:D call 555 123 4567!")
+>> ['I', "can't", 'sleep', ':D', 'call', '555 123 4567', '!']
+
+verify_tokenizer(posts) checks that both tokenizers agree on a corpus.
+"""
+
+import regex
+from nltk.tokenize import TweetTokenizer
+
+# chunks of text between whitespace, as understood by the TweetTokenizer regex
+CHUNK_RE = regex.compile(r"\S+")
+
+# characters joining the letters of a plain word, ex. "can't", "x-ray"
+_WORD_JOINERS = str.maketrans("", "", "'-_")
+
+# punctuation marks which are a token on their own after a plain word
+# ('.' is not one of them, as it may start ellipsis dots with the next chunk)
+TRAILING_PUNCTUATION = frozenset(",;:!?")
+# eyes of the emoticons written mouth first, ex. "D:", "Do;", only taken as
+# punctuation after a word longer than such an emoticon
+EMOTICON_EYES = frozenset(":;")
+
+# separates the runs of other chunks of a text tokenized at once: a token on its
+# own, which no token of TweetTokenizer can contain or span
+_RUN_SEPARATOR = "\x00"
+
+
+def _is_plain_word(word):
+    return word.isalpha() or (word[0].isalpha() and word[-1].isalpha() and
+                              word.translate(_WORD_JOINERS).isalpha())
+
+
+class FastTweetTokenizer:
+    """
+        Tokenizer equivalent to TweetTokenizer() with its default options
+    """
+
+    def __init__(self):
+        self.tweet_tokenizer = TweetTokenizer()
+
+    def tokenize(self, text):
+        """ Return the list of tokens of the text, see TweetTokenizer.tokenize """
+        # the separator (also written as a numeric html entity) would be mistaken
+        if _RUN_SEPARATOR in text or "&#" in text:
+            return self.tweet_tokenizer.tokenize(text)
+
+        # tokens of the plain words, None for the runs of other chunks
+        items = []
+        append = items.append
+        runs = []
+        run_start = None  # start of the current run of other chunks
+        run_end = 0
+        for match in CHUNK_RE.finditer(text):
+            word = match.group()
+            punctuation = None
+            if not word.isalpha():  # words of letters only are the most frequent chunks
+                if word[-1] in TRAILING_PUNCTUATION and len(word) > 1 and \
+                        (len(word) > 3 or word[-1] not in EMOTICON_EYES):
+                    word, punctuation = word[:-1], word[-1]
+
+                if not _is_plain_word(word):
+                    if run_start is None:
+                        run_start = match.start()
+                    run_end = match.end()
+                    continue
+
+            if run_start is not None:
+                runs.append(text[run_start:run_end])
+                append(None)
+                run_start = None
+            append(word)
+            if punctuation is not None:
+                append(punctuation)
+
+        if run_start is not None:
+            runs.append(text[run_start:run_end])
+            append(None)
+        if not runs:
+            return items
+
+        # tokenize all runs at once and replace the placeholders with their tokens
+        run_tokens = self.tweet_tokenizer.tokenize((" " + _RUN_SEPARATOR + " ").join(runs))
+        tokens = []
+        position = 0
+        for item in items:
+            if item is not None:
+                tokens.append(item)
+                continue
+            while position < len(run_tokens) and run_tokens[position] != _RUN_SEPARATOR:
+                tokens.append(run_tokens[position])
+                position += 1
+            position += 1  # skip the separator
+        return tokens
+
+    def tokenize_batch(self, texts):
+        """ Return the list of tokens of each text """
+        return [self.tokenize(text) for text in texts]
+
+
+def verify_tokenizer(texts, tokenizer=None, reference=None):
+    """
+        Compare the tokens of the fast tokenizer with TweetTokenizer on a corpus,
+        ex. a sample of the posts to preprocess
+
+        Return
+        ---------------------------------------------------------------
+        list of (text, TweetTokenizer tokens, fast tokens) for the texts whose
+        tokens differ, empty if both tokenizers agree
+    """
+    tokenizer = tokenizer or FastTweetTokenizer()
+    reference = reference or TweetTokenizer()
+    differences = []
+    for text in texts:
+        expected = reference.tokenize(text)
+        tokens = tokenizer.tokenize(text)
+        if tokens != expected:
+            differences.append((text, expected, tokens))
+    return differences
@@ -0,0 +1,162 @@
+"""
+Persistent lemma and stem lookup tables
+
+The lemma of a (word, pos) pair and the stem of a word never change, so they
+are stored on disk and reused by the following runs. One table is stored per
+kind ("lemma", "stem"), language, algorithm and part of speech, and loaded on
+its first lookup. NLTK is only called for the words missing from the table.
+The words added by the worker processes of Preprocess.preprocess_corpus and
+preprocess_stream are sent back with their chunk and merged into the tables of
+the main process, saved by Preprocess.save_lookup_tables.
+
+Ex.:
+prep = Preprocess(lookup_dir="lookup_tables")
+prep.build_lookup_tables(tokenized_posts)   # first run: fill and save the tables
+prep.stem_words(["running"])               # next runs: looked up in the table
+"""
+
+import hashlib
+import os
+import pickle
+
+
+def stemmer_name(stemmer):
+    """
+        Return the name of the stem table of a stemmer: its algorithm and its
+        options differing from the default ones
+
+        Ex.:
+        stemmer_name(SnowballStemmer("english"))
+        >> 'EnglishStemmer'
+        stemmer_name(SnowballStemmer("english", ignore_stopwords=True))
+        >> 'EnglishStemmer-ignore_stopwords'
+    """
+    # snowball stemmers keep the stemmer of their language in .stemmer
+    stemmer = getattr(stemmer, "stemmer", stemmer)
+    parts = [type(stemmer).__name__]
+    if getattr(stemmer, "stopwords", None):  # snowball, ignore_stopwords=True
+        parts.append("ignore_stopwords")
+    mode = getattr(stemmer, "mode", None)  # porter
+    if mode is not None and mode != getattr(stemmer, "NLTK_EXTENSIONS", None):
+        parts.append(str(mode))
+    if getattr(stemmer, "_strip_prefix", False):  # lancaster, strip_prefix_flag=True
+        parts.append("strip_prefix")
+    rule_tuple = getattr(stemmer, "_rule_tuple", None)
+    if rule_tuple is not None and rule_tuple != getattr(stemmer, "default_rule_tuple", None):
+        parts.append("rules" + hashlib.sha256(repr(rule_tuple).encode("utf-8")).hexdigest()[:12])
+    return "-".join(parts)
+
+
+class LookupTable:
+    """
+        Table word -> lemma or stem stored in a pickle file
+
+        Parameters
+        -------------------------------------------------------
+        path : file of the table, loaded on first use
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._table = None
+        # words added since the table was loaded or saved
+        self.new_entries = {}
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        return {}
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = self._load()
+        return self._table
+
+    def __len__(self):
+        return len(self.table)
+
+    def wrap(self, function):
+        """ Return function(word) looked up in the table, computed and added to it on a miss """
+        table, new_entries = self.table, self.new_entries
+
+        def lookup(word):
+            try:
+                return table[word]
+            except KeyError:
+                value = table[word] = new_entries[word] = function(word)
+                return value
+
+        return lookup
+
+    def update(self, entries):
+        """ Add the words computed elsewhere (ex. in a worker process), written by the next save """
+        table, new_entries = self.table, self.new_entries
+        for word, value in entries.items():
+            if word not in table:
+                table[word] = new_entries[word] = value
+
+    def save(self):
+        """ Write the table to disk if words were added, keeping the words saved meanwhile by other runs """
+        if self._table is None or not self.new_entries:
+            return
+
+        table = self._load()
+        table.update(self._table)
+        self._table.update(table)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.new_entries.clear()
+
+
+class LookupTables:
+    """
+        Lemma and stem tables of a directory, one LookupTable per kind,
+        language, algorithm and part of speech
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+
+    def get(self, kind, lang, algorithm, pos=None):
+        """
+            Return the table of the given kind ("lemma", "stem"), language,
+            algorithm (ex. "wordnet", "EnglishStemmer") and part of speech
+        """
+        key = (kind, lang, algorithm, pos)
+        table = self.tables.get(key)
+        if table is None:
+            filename = "_".join(str(part) for part in key if part is not None) + ".pickle"
+            table = self.tables[key] = LookupTable(os.path.join(self.directory, filename))
+        return table
+
+    def take_new_entries(self):
+        """
+            Return the words added to each table since the last call, as a dict
+            key of the table -> {word: value} for LookupTables.merge, and stop
+            tracking them (they are not saved by this object anymore)
+        """
+        entries = {}
+        for key, table in self.tables.items():
+            if table.new_entries:
+                entries[key] = dict(table.new_entries)
+                table.new_entries.clear()
+        return entries
+
+    def merge(self, entries):
+        """ Add the words of take_new_entries (ex. of a worker process) to the tables """
+        for key, words in entries.items():
+            self.get(*key).update(words)
+
+    def save(self):
+        """ Write all tables with new words to disk """
+        for table in self.tables.values():
+            table.save()
@@ -0,0 +1,111 @@
+"""
+Compiled preprocessing pipeline
+
+A list of preprocessing steps is compiled once into a single callable:
+- consecutive steps working on the whole string of the text are chained
+- consecutive steps working token by token are fused into one loop over the
+  tokens of a document, so that no intermediate list is built between them
+- the other steps (tokenization, lemmatization, custom functions, ...) work
+  on the whole document and separate the fused groups
+When the preprocessor profiles its stages (see stage_profiler.py), every step
+runs on its own and is timed under its name.
+
+Ex.:
+pipeline = Preprocess().build_pipeline(["replace_contractions", "tokenize",
+                                        "remove_punctuation", "to_lowercase"])
+pipeline("I can't sleep!")
+>> ['i', 'cannot', 'sleep']
+"""
+
+# kinds of compiled steps, see Preprocess.compile_step
+TEXT_STEP = "text"  # function(str) -> str
+TOKENIZE_STEP = "tokenize"  # function(str) -> list of tokens
+TOKEN_STEP = "token"  # function(token) -> token, or None to delete the token
+DOCUMENT_STEP = "document"  # function(document) -> document
+
+
+def _chain_text_functions(functions):
+    if len(functions) == 1:
+        return functions[0]
+
+    def run(text):
+        for function in functions:
+            text = function(text)
+        return text
+
+    return run
+
+
+def _fuse_token_functions(functions):
+    if len(functions) == 1:
+        function = functions[0]
+
+        def run_single(tokens):
+            return [word for word in map(function, tokens) if word is not None]
+
+        return run_single
+
+    def run(tokens):
+        clean_tokens = []
+        append = clean_tokens.append
+        for word in tokens:
+            for function in functions:
+                word = function(word)
+                if word is None:
+                    break
+            else:
+                append(word)
+        return clean_tokens
+
+    return run
+
+
+class Pipeline:
+    """
+        Preprocessing steps compiled into a single callable
+
+        Parameters
+        -------------------------------------------------------
+        preprocessor : Preprocess object whose methods are used
+        steps :        list of preprocessing steps, see Preprocess.resolve_steps
+    """
+
+    def __init__(self, preprocessor, steps=None):
+        self.preprocessor = preprocessor
+
+        profiler = getattr(preprocessor, "profiler", None)
+
+        # group consecutive text steps and consecutive token steps,
+        # unless the steps are profiled one by one
+        groups = []
+        names = []
+        for step, kwargs in preprocessor.resolve_steps(steps):
+            compiled = preprocessor.compile_step(step, kwargs)
+            if compiled is None:  # step without effect, ex. emojis for french texts
+                continue
+            kind, function = compiled
+            if profiler is None and kind in (TEXT_STEP, TOKEN_STEP) and groups and groups[-1][0] == kind:
+                groups[-1][1].append(function)
+            else:
+                groups.append((kind, [function]))
+                names.append(getattr(step, "__name__", None) or repr(step))
+
+        self.groups = groups
+        self._runners = []
+        for (kind, functions), name in zip(groups, names):
+            if kind == TEXT_STEP:
+                run = _chain_text_functions(functions)
+            elif kind == TOKEN_STEP:
+                run = _fuse_token_functions(functions)
+            else:
+                run = functions[0]
+            self._runners.append(run if profiler is None else profiler.wrap(name, run))
+
+    def __call__(self, text):
+        for run in self._runners:
+            text = run(text)
+        return text
+
+    def map(self, texts):
+        """ Run the pipeline on every text and return the list of results """
+        return [self(text) for text in texts]
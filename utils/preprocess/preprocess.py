@@ -12,15 +12,159 @@ Last editing date: 21/07/2022
 import string
 import unicodedata
 
-import sys
+import os
 from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from functools import partial
+from itertools import islice
 
 import inflect  # natural language related tasks of generating plurals, singular nouns, etc.
-from nltk.tokenize import TweetTokenizer
 import numpy as np
 
 from defines import *
 from contractions_def import *
+from pipeline import Pipeline, TEXT_STEP, TOKENIZE_STEP, TOKEN_STEP, DOCUMENT_STEP
+from spans import SpanPipeline
+from token_cache import TokenCache
+from stage_profiler import StageProfiler
+from lookup_tables import LookupTables, stemmer_name
+from emoji_trie import default_emoji_trie
+from emoticon_index import default_emoticon_index
+
+# Preprocessing steps run by default on a corpus, in the order used in the
+# reddit posts preprocessing notebook. A step is either the name of a Preprocess
+# method or a tuple (name, dict of keyword arguments)
+DEFAULT_STEPS = ["replace_contractions",
+                 "replace_special_words",
+                 ("replace_hashtags_URL_USER", {"mode_URL": "delete",
+                                                "mode_Mentions": "delete",
+                                                "mode_Hashtag": "replace"}),
+                 "tokenize",
+                 "remove_punctuation",
+                 "preprocess_emojis",
+                 "preprocess_emoticons",
+                 "remove_non_ascii",
+                 "to_lowercase",
+                 "replace_numbers",
+                 "lemmatize_verbs",
+                 "remove_stopwords"]
+
+# Steps working on the whole string of the text
+TEXT_STEPS = ["replace_contractions",
+              "replace_special_words",
+              "replace_hashtags_URL_USER",
+              "remove_repeating_characters",
+              "remove_repeating_words",
+              "remove_non_ascii_text",
+              "preprocess_emojis_text"]
+
+# Tokens removed by remove_punctuation: every substring of string.punctuation
+# (as checked by "word not in string.punctuation") and some other separators
+PUNCTUATION_TOKENS = frozenset([string.punctuation[i:j] for i in range(len(string.punctuation) + 1)
+                                for j in range(i, len(string.punctuation) + 1)] +
+                               ['...', '…', '..', "\n", "\t", " ", ""])
+
+# pipeline used by the worker processes of Preprocess.preprocess_corpus
+_worker_pipeline = None
+
+
+def _init_worker(preprocessor, steps):
+    """ Compile the pipeline once in each worker process """
+    global _worker_pipeline
+    _worker_pipeline = preprocessor.build_pipeline(steps)
+    if preprocessor.lookup_tables is not None:
+        # the words not saved yet by the main process are not sent back
+        preprocessor.lookup_tables.take_new_entries()
+
+
+def _preprocess_chunk(chunk):
+    """
+        Preprocess a chunk of texts inside a worker process
+
+        Return
+        ---------------------------------------------------------------
+        tuple (preprocessed texts, stage counters of the chunk or None, words
+        added to the lookup tables or None), see Preprocess._merge_worker_results
+    """
+    preprocessor = _worker_pipeline.preprocessor
+    profiler, lookup_tables = preprocessor.profiler, preprocessor.lookup_tables
+    if profiler is not None:
+        profiler.clear()
+    output = _worker_pipeline.map(chunk)
+    return (output, None if profiler is None else profiler.stats(),
+            None if lookup_tables is None else lookup_tables.take_new_entries())
+
+
+# compiled (pattern, replace function) of replace_hashtags_URL_USER for each combination of modes
+_hashtags_URL_USER_replacers = {}
+
+_HASHTAGS_URL_USER_MODES = {"mode_URL": {"replace": Constants.URL, "delete": "", "keep": False},
+                            "mode_Mentions": {"replace": Constants.USER, "delete": "",
+                                              "screen_name": None, "keep": False},
+                            "mode_Hashtag": {"replace": None, "delete": "", "keep": False}}
+
+
+def _hashtags_URL_USER_replacer(mode_URL, mode_Mentions, mode_Hashtag):
+    """
+        Return the pattern matching the urls, mentions and hashtags to change with the
+        given modes, and the function replacing a match, compiled once per combination
+    """
+    modes = (mode_URL, mode_Mentions, mode_Hashtag)
+    replacer = _hashtags_URL_USER_replacers.get(modes)
+    if replacer is not None:
+        return replacer
+
+    patterns = [("url", Patterns.URL_PATTERN.pattern), ("mention", Patterns.MENTION_PATTERN.pattern),
+                ("hashtag", Patterns.HASHTAG_PATTERN.pattern)]
+    url_pattern = Patterns.URL_PATTERN.pattern
+    if mode_URL == "delete":
+        # urls used to be changed before the mentions and hashtags, which thus
+        # stop where a url starts, ex. "#longcovidhttps://t.co/x"
+        patterns[1:] = [("mention", r"@(?:(?!{0})[\w_])+".format(url_pattern)),
+                        ("hashtag", r"#(?:(?!{0})\w)+".format(url_pattern))]
+    elif mode_URL == "replace":
+        # the url replaced first becomes the end of the mention or hashtag,
+        # ex. "#longcovidhttps://t.co/x" -> "#longcovidURL", changed as a whole
+        patterns[1:] = [("mention", r"@(?:(?:(?!{0})[\w_])+(?:{0})?|{0})".format(url_pattern)),
+                        ("hashtag", r"#(?:(?:(?!{0})\w)+(?:{0})?|{0})".format(url_pattern))]
+
+    # replacement of each kind of match: a string, None to delete the first character ('@', '#')
+    replacements = {}
+    alternatives = []
+    for (argument, values), mode, (kind, pattern) in zip(_HASHTAGS_URL_USER_MODES.items(),
+                                                         modes, patterns):
+        if mode not in values:
+            raise ValueError("{} {} not defined!".format(argument, mode))
+        if values[mode] is not False:
+            replacements[kind] = values[mode]
+            alternatives.append("(?P<{}>{})".format(kind, pattern))
+
+    if not alternatives:
+        replacer = (None, None)
+    else:
+        def replace(match):
+            kind = match.lastgroup
+            value = replacements[kind]
+            if value is not None:
+                return value
+            word = match.group()
+            if mode_URL == "replace" and kind != "url":
+                word = Patterns.URL_PATTERN.sub(Constants.URL, word)
+            return word[1:]
+
+        replacer = (re.compile("|".join(alternatives)), replace)
+    _hashtags_URL_USER_replacers[modes] = replacer
+    return replacer
+
+
+def _print_missing_emoji_category(char, name):
+    print("INFO: No category set for emoji {} -> delete emoji {}".format(char, name))
+
+
+def _apply_token_function(function, text):
+    """ Apply a per-token function to a list of tokens, deleting the tokens mapped to None """
+    return [word for word in map(function, text) if word is not None]
 
 
 # assume input matrix contains term frequencies
@@ -39,20 +183,335 @@ def tfidf_transform(mat):
 
 class Preprocess:
 
-    def __init__(self, lang="english"):
-        self.TweetTokenizer = TweetTokenizer()
+    def __init__(self, lang="english", cache_size=100000, lookup_dir=None, tokenizer="tweet",
+                 profile=False):
+        """
+            Parameters
+            -------------------------------------------------------
+            lang :       language of the texts ("english", "french")
+            cache_size : maximal number of distinct words cached per token stage
+                         (lowercase, non-ascii, numbers, lemmatization, stemming),
+                         0 disables the caches
+            lookup_dir : directory of the persistent lemma and stem tables,
+                         see lookup_tables.py. Default: None, no tables
+            tokenizer :  tokenizer of tokenize ("tweet", "fast")
+                         if "tweet" : nltk's TweetTokenizer
+                         if "fast" : FastTweetTokenizer, giving the same tokens faster,
+                                     see fast_tokenizer.py
+            profile :    if True, the pipelines built afterwards time every step,
+                         see stage_profiler.py and print_profile
+        """
+        if tokenizer not in ("tweet", "fast"):
+            raise ValueError("tokenizer {} not defined!".format(tokenizer))
+        self.tokenizer = tokenizer
+        self.TweetTokenizer = None  # created on first use, see get_tokenizer
         # Constant words like URL, USER, EMOT_SMILE, etc. that we want to keep in uppercase
         self.Constant_words = [value for attr, value in Constants.__dict__.items()
                                if not callable(getattr(Constants, attr)) and
                                not attr.startswith("__")] + Emotions.EMOTION_CATEGORIES
 
-        self.WN_Lemmatizer_EN = WordNetLemmatizer()
+        self.WN_Lemmatizer_EN = None  # loaded on first use, see get_lemmatizer
+        self.POS_Tagger_EN = None  # loaded on first use, see get_pos_tagger
+        self.Number_Engine = None  # created on first use, see get_number_engine
         self.lang = lang
 
+        self.cache_size = cache_size
+        self.token_caches = {}
+        # manual stopword lists of remove_stopwords converted to sets
+        self.manual_stopword_sets = {}
+
+        self.lookup_tables = LookupTables(lookup_dir) if lookup_dir is not None else None
+
+        self.profiler = StageProfiler() if profile else None
+
     @abstractmethod
     def get_text(self, raw_input):
         pass
 
+    def token_cache(self, stage):
+        """ Return the TokenCache of the given stage, created on first use """
+        cache = self.token_caches.get(stage)
+        if cache is None:
+            cache = self.token_caches[stage] = TokenCache(self.cache_size)
+        return cache
+
+    def cache_stats(self):
+        """
+            Return the hits, misses and size of the cache of every token stage
+
+            Ex.:
+            prep.cache_stats()
+            >> {'to_lowercase': {'hits': 95210, 'misses': 4790, 'size': 4790,
+                                 'maxsize': 100000, 'hit_rate': 0.9521}, ...}
+        """
+        stats = {}
+        for stage, cache in self.token_caches.items():
+            if isinstance(stage, tuple):  # stemming cache of a given stemmer
+                stage = "{} ({})".format(stage[0], type(stage[1]).__name__)
+            stats[stage] = cache.stats()
+        return stats
+
+    def clear_caches(self):
+        """ Empty the caches of all token stages """
+        for cache in self.token_caches.values():
+            cache.clear()
+
+    def profile_stats(self):
+        """
+            Return the wall time, calls, tokens in and tokens out of every
+            preprocessing stage, see stage_profiler.py
+
+            Ex.:
+            prep = Preprocess(profile=True)
+            prep.preprocess_corpus(posts)
+            prep.profile_stats()
+            >> {'tokenize': {'time': 3.02, 'calls': 100000, 'tokens_in': 0,
+                             'tokens_out': 2563120, 'time_per_call': 3.02e-05}, ...}
+        """
+        if self.profiler is None:
+            raise ValueError("Preprocess was created without profile")
+        return self.profiler.stats()
+
+    def print_profile(self, sort="time"):
+        """ Print the stats of the stages as a table sorted by the given counter, see profile_stats """
+        if self.profiler is None:
+            raise ValueError("Preprocess was created without profile")
+        print(self.profiler.table(sort))
+
+    def resolve_steps(self, steps=None):
+        """
+            Transform a list of preprocessing steps into a list of
+            (function, keyword arguments) tuples
+
+            A step is either the name of a Preprocess method, a tuple
+            (name, dict of keyword arguments) or a function taking the output
+            of the previous step. If steps is None, DEFAULT_STEPS is used.
+        """
+        if steps is None:
+            steps = DEFAULT_STEPS
+
+        resolved = []
+        for step in steps:
+            if isinstance(step, tuple):
+                step, kwargs = step
+            else:
+                kwargs = {}
+
+            if callable(step):
+                resolved.append((step, kwargs))
+            elif isinstance(step, str) and not step.startswith("_") and \
+                    callable(getattr(self, step, None)):
+                resolved.append((getattr(self, step), kwargs))
+            else:
+                raise ValueError("Preprocessing step {} not defined!".format(step))
+
+        return resolved
+
+    def preprocess_text(self, text, steps=None):
+        """
+            Run the given preprocessing steps one after the other on a single text
+
+            Ex.:
+            prep.preprocess_text("I can't sleep :(", ["replace_contractions", "tokenize"])
+            >> ['I', 'cannot', 'sleep', ':(']
+        """
+        return self.build_pipeline(steps)(text)
+
+    def build_pipeline(self, steps=None):
+        """
+            Compile the given preprocessing steps once into a single callable,
+            see pipeline.py
+
+            Ex.:
+            pipeline = prep.build_pipeline(["tokenize", "remove_punctuation", "to_lowercase"])
+            clean_posts = pipeline.map(posts)
+        """
+        return Pipeline(self, steps)
+
+    def build_span_pipeline(self, steps=None):
+        """
+            Compile the given preprocessing steps into a callable returning the
+            tokens as spans of the original text, see spans.py
+
+            Ex.:
+            pipeline = prep.build_span_pipeline(["replace_contractions", "tokenize", "to_lowercase"])
+            spans = pipeline("I can't sleep")
+            list(spans)
+            >> [(0, 1, 'i'), (2, 7, 'cannot'), (8, 13, 'sleep')]
+        """
+        return SpanPipeline(self, steps)
+
+    def preprocess_spans(self, text, steps=None):
+        """ Run the given preprocessing steps on a single text and return its TokenSpans """
+        return self.build_span_pipeline(steps)(text)
+
+    def warmup(self, steps=None):
+        """
+            Load everything used by the given preprocessing steps (definitions of
+            defines.py, NLTK models, emoji and emoticon tables, ...) up front
+            instead of on the first texts, and return the compiled pipeline
+
+            Ex.:
+            pipeline = prep.warmup(DEFAULT_STEPS)   # at service startup
+        """
+        warmup()
+        pipeline = self.build_pipeline(steps)
+        pipeline("")
+        return pipeline
+
+    def compile_step(self, step, kwargs):
+        """
+            Compile a resolved preprocessing step (function, keyword arguments)
+
+            Return
+            -------------------------------------------------------------
+            None if the step has no effect (ex. emojis of a french text),
+            otherwise a tuple (kind, function) where kind is one of
+            - TEXT_STEP : function(str) -> str
+            - TOKENIZE_STEP : function(str) -> list of tokens
+            - TOKEN_STEP : function(token) -> token, or None to delete the token
+            - DOCUMENT_STEP : function(document) -> document
+        """
+        name = getattr(step, "__name__", None)
+
+        # custom function or method of another object
+        if getattr(step, "__self__", None) is not self:
+            return DOCUMENT_STEP, partial(step, **kwargs) if kwargs else step
+
+        if name == "tokenize":
+            return TOKENIZE_STEP, self.tokenize
+
+        if name in TEXT_STEPS:
+            if name == "replace_contractions" and self.lang != "english":
+                return None
+            return TEXT_STEP, partial(step, **kwargs) if kwargs else step
+
+        # the emotion counter of limit_nEmojis needs the whole document
+        if name == "preprocess_emojis" and kwargs.get("limit_nEmojis", False) is not False:
+            return DOCUMENT_STEP, partial(step, **kwargs)
+
+        token_function_factory = getattr(self, "_token_" + name, None)
+        if token_function_factory is not None:
+            function = token_function_factory(**kwargs)
+            return None if function is None else (TOKEN_STEP, function)
+
+        return DOCUMENT_STEP, partial(step, **kwargs) if kwargs else step
+
+    def compile_text_edits(self, step, kwargs):
+        """
+            Compile a text step for the span mode, see spans.py
+
+            Return
+            -------------------------------------------------------------
+            None if the step does not change the text, otherwise a list of
+            passes (pattern, function(match) -> replacement) such that running
+            text = pattern.sub(function, text) for each pass gives the output of the step
+        """
+        name = getattr(step, "__name__", None)
+        edits_factory = getattr(self, "_edits_" + name, None) if name in TEXT_STEPS else None
+        if edits_factory is None or getattr(step, "__self__", None) is not self:
+            raise ValueError("Preprocessing step {} not supported with spans!".format(name or step))
+        return edits_factory(**kwargs)
+
+    def preprocess_corpus(self, texts, steps=None, workers=1, chunksize=None):
+        """
+            Run the given preprocessing steps on every text of a corpus
+
+            Parameters
+            -------------------------------------------------------
+            texts :     iterable of texts (list, pandas Series, ...)
+            steps :     list of preprocessing steps, see resolve_steps.
+                        Default: DEFAULT_STEPS
+            workers :   number of processes to use. If None, all available cores are used.
+                        With workers=1 the texts are processed in the current process
+            chunksize : number of texts sent at once to a worker process.
+                        Default: texts are split into 4 chunks per worker
+
+            Return
+            -------------------------------------------------------------
+            List with the preprocessed texts, in the same order as the input
+            and identical to the serial output
+        """
+        texts = list(texts)
+        # fail early on undefined steps, before starting the worker processes
+        pipeline = self.build_pipeline(steps)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(texts))
+
+        if workers <= 1:
+            return pipeline.map(texts)
+
+        if chunksize is None:
+            chunksize = -(-len(texts) // (workers * 4))
+        chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+
+        # the preprocessor is pickled and the pipeline compiled once per worker,
+        # the executor returns the chunks in their submission order
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self, steps)) as executor:
+            output = []
+            for chunk, stats, entries in executor.map(_preprocess_chunk, chunks):
+                output.extend(chunk)
+                self._merge_worker_results(stats, entries)
+            return output
+
+    def _merge_worker_results(self, stats, entries):
+        """
+            Add the stage counters and the lookup table words of a chunk
+            preprocessed by a worker process to the ones of this process
+        """
+        if stats is not None:
+            self.profiler.merge(stats)
+        if entries:
+            self.lookup_tables.merge(entries)
+
+    def preprocess_stream(self, texts, steps=None, workers=1, chunksize=1000):
+        """
+            Run the given preprocessing steps on a stream of texts, yielding the
+            preprocessed texts one by one in the input order
+
+            Unlike preprocess_corpus, the texts are read lazily and at most
+            2 * workers chunks are in progress at once, so that memory does not
+            grow with the size of the corpus, see streaming.py
+
+            Parameters
+            -------------------------------------------------------
+            texts :     iterable of texts, ex. a generator reading a file
+            steps :     list of preprocessing steps, see resolve_steps.
+                        Default: DEFAULT_STEPS
+            workers :   number of processes to use. If None, all available cores are used.
+                        With workers=1 the texts are processed in the current process
+            chunksize : number of texts sent at once to a worker process
+        """
+        pipeline = self.build_pipeline(steps)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers <= 1:
+            for text in texts:
+                yield pipeline(text)
+            return
+
+        texts = iter(texts)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self, steps)) as executor:
+            pending = deque()
+            while True:
+                # keep every worker busy with one chunk and one waiting chunk
+                while len(pending) < 2 * workers:
+                    chunk = list(islice(texts, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(_preprocess_chunk, chunk))
+                if not pending:
+                    return
+                result, stats, entries = pending.popleft().result()
+                self._merge_worker_results(stats, entries)
+                yield from result
+
     def replace_contractions(self, text):
         """ Replace contractions in string of text
             Examples:
@@ -73,6 +532,22 @@ class Preprocess:
         else:
             return text
 
+    def _edits_replace_contractions(self):
+        return contractions_engine.passes()
+
+    def replace_contractions_batch(self, texts):
+        """
+            Replace contractions in a list of texts in a single scan
+
+            Return
+            ---------------------------------------------------------------
+            list of texts, identical to [replace_contractions(text) for text in texts]
+        """
+        if self.lang == "english":
+            return contractions_fix_batch(texts)
+        else:
+            return list(texts)
+
     def replace_hashtags_URL_USER(self, text, mode_URL="keep",
                                   mode_Mentions="keep", mode_Hashtag="keep"):
         """
@@ -99,6 +574,9 @@ class Preprocess:
                        if "delete" : all hashtags are deleted
                        if 'keep' : keep hashtag
 
+            The text is scanned once for the urls, mentions and hashtags to change,
+            a mode not defined raises a ValueError
+
             Return
             -------------------------------------------------------------
             List of preprocessed text tokens
@@ -113,45 +591,14 @@ class Preprocess:
 
 
         """
-        if mode_URL == "replace":
-            text = Patterns.URL_PATTERN.sub(Constants.URL, text)
-        elif mode_URL == "delete":
-            text = Patterns.URL_PATTERN.sub("", text)
-        elif mode_URL == "keep":
-            text = text
-        else:
-            print("ERROR: mode_URL {} not defined!".format(mode_URL))
-            exit()
-
-        if mode_Mentions == "replace":
-            text = Patterns.MENTION_PATTERN.sub(Constants.USER, text)
-        elif mode_Mentions == "delete":
-            text = Patterns.MENTION_PATTERN.sub("", text)
-        elif mode_Mentions == "screen_name":
-            mentions = Patterns.MENTION_PATTERN.findall(text)
-            for mention in mentions:
-                text = text.replace("@" + mention, mention)
-        elif mode_Mentions == "keep":
-            text = text
-        else:
-            print("ERROR: mode_Mentions {} not defined!".format(mode_Mentions))
-            exit()
-
-        if mode_Hashtag == "replace":
-            hashtags = Patterns.HASHTAG_PATTERN.findall(text)
-            for hashtag in hashtags:
-                text = text.replace("#" + hashtag, hashtag)
-        elif mode_Hashtag == "delete":
-            hashtags = Patterns.HASHTAG_PATTERN.findall(text)
-            for hashtag in hashtags:
-                text = text.replace("#" + hashtag, "")
-        elif mode_Hashtag == "keep":
-            text = text
-        else:
-            print("ERROR: mode_Hashtag {} not defined!".format(mode_Hashtag))
-            exit()
+        pattern, replace = _hashtags_URL_USER_replacer(mode_URL, mode_Mentions, mode_Hashtag)
+        if pattern is None:  # keep everything
+            return text
+        return pattern.sub(replace, text)
 
-        return text
+    def _edits_replace_hashtags_URL_USER(self, mode_URL="keep", mode_Mentions="keep", mode_Hashtag="keep"):
+        pattern, replace = _hashtags_URL_USER_replacer(mode_URL, mode_Mentions, mode_Hashtag)
+        return None if pattern is None else [(pattern, replace)]
 
     def replace_special_words(self, text):
         """
@@ -160,18 +607,15 @@ class Preprocess:
             For ex.: all the type 1 related words like "#type1", "Type 1", "t1d", etc.
                      are transformed to "type1"
 
+            All word lists of WordLists.SPECIAL_WORDS (long covid, covid and long term
+            words) are replaced in one pass, see special_words.py
         """
 
-        # replace long covid words
-        text = WordLists.LONGCOVID_WORDS.sub(Constants.LONGCOVID, text)
+        return WordLists.SPECIAL_WORDS.replace(text)
 
-        # replace covid words
-        text = WordLists.COVID_WORDS.sub(Constants.COVID, text)
-
-        # replace long term words
-        text = WordLists.LONGTERM_WORDS.sub(Constants.LONGTERM, text)
-
-        return text
+    def _edits_replace_special_words(self):
+        replacements = WordLists.SPECIAL_WORDS.replacements
+        return [(WordLists.SPECIAL_WORDS.pattern, lambda match: replacements[match.group()])]
 
     def remove_repeating_characters(self, text):
         """
@@ -180,6 +624,9 @@ class Preprocess:
         """
         return re.sub(r'(.)\1+', r'\1\1', text)
 
+    def _edits_remove_repeating_characters(self):
+        return [(re.compile(r'(.)\1+'), lambda match: match.group(1) * 2)]
+
     def remove_repeating_words(self, text):
         """
             Remove repeating words and only keep one
@@ -187,6 +634,9 @@ class Preprocess:
         """
         return re.sub(r'\b(\w+)( \1\b)+', r'\1', text)
 
+    def _edits_remove_repeating_words(self):
+        return [(re.compile(r'\b(\w+)( \1\b)+'), lambda match: match.group(1))]
+
     def tokenize(self, text):
         """
             Tokenizes text in its single components (words, emojis, emoticons)
@@ -196,7 +646,25 @@ class Preprocess:
             print(tokenize(s))
             >> ['I', 'love', ':D', 'python', '😄', ':-)']
         """
-        return list(self.TweetTokenizer.tokenize(text))
+        return list(self.get_tokenizer().tokenize(text))
+
+    def tokenize_batch(self, texts):
+        """ Tokenize a list of texts, see tokenize """
+        tokenizer = self.get_tokenizer()
+        if hasattr(tokenizer, "tokenize_batch"):
+            return tokenizer.tokenize_batch(texts)
+        return [list(tokenizer.tokenize(text)) for text in texts]
+
+    def get_tokenizer(self):
+        """ Return the tokenizer selected with the tokenizer parameter, created on first use """
+        if self.TweetTokenizer is None:
+            if self.tokenizer == "fast":
+                from fast_tokenizer import FastTweetTokenizer
+                self.TweetTokenizer = FastTweetTokenizer()
+            else:
+                from nltk.tokenize import TweetTokenizer
+                self.TweetTokenizer = TweetTokenizer()
+        return self.TweetTokenizer
 
     def remove_punctuation(self, text):
         """
@@ -206,16 +674,21 @@ class Preprocess:
 
             TODO: check if !,? may contain useful information
         """
+        return _apply_token_function(self._token_remove_punctuation(), text)
 
+    def _token_remove_punctuation(self):
         def check_punctuation(word):
-            return word not in string.punctuation and word not in ['...', '…', '..', "\n", "\t", " ", ""]
+            return None if word in PUNCTUATION_TOKENS else word
 
-        return [word for word in text if check_punctuation(word)]
+        return check_punctuation
 
     def preprocess_emojis(self, text, limit_nEmojis=False):
         '''
             Replace emojis with their emotion category
 
+            Emojis are looked up in a codepoint trie (see emoji_trie.py), so that
+            emojis with skin tones, flags and ZWJ sequences are recognized as well
+
             Parameters:
             ------------------------------------------------------------
             text:          tokenized text
@@ -229,97 +702,182 @@ class Preprocess:
         '''
 
         if self.lang == "english":
+            # it is possible that one emoji is categorized into two
+            # different categories, for instance: 'EMOT_SURPRISE EMOT_FEAR'
+            return default_emoji_trie().replace_tokens(text, limit_nEmojis,
+                                                       on_missing_category=_print_missing_emoji_category)
 
-            # counts occurrences of emojis in their emotion category
-            emot_counter = {}
-            for emotion in Emotions.EMOTION_CATEGORIES:
-                emot_counter[emotion] = 0
-
-            clean_text = []
-            for ind, char in enumerate(text):
-                if char in UNICODE_EMOJI:
-
-                    emot_cat = EMOJI_TO_CATEGORY[UNICODE_EMOJI[char]]
-                    if emot_cat != "":
+        # other language
+        else:
+            return (text)
 
-                        if limit_nEmojis is not False:
+    def _token_preprocess_emojis(self, limit_nEmojis=False):
+        if self.lang != "english":
+            return None
 
-                            # it is possible that one emoji is categorized into two
-                            # different categories, for instance: 'EMOT_SURPRISE EMOT_FEAR'
-                            emot_cat = emot_cat.split(" ")
-                            for emo in emot_cat:
-                                emot_counter[emo] += 1  # counts for the emotion in this text
-                                if emot_counter[emo] <= limit_nEmojis:
-                                    clean_text.append(emo)
-                        else:
-                            clean_text.append(emot_cat)
+        return partial(default_emoji_trie().replace_token,
+                       on_missing_category=_print_missing_emoji_category)
 
-                    else:
-                        print("INFO: No category set for emoji {} -> delete emoji {}".format(char, UNICODE_EMOJI[char]))
-                else:
-                    clean_text.append(char)
+    def preprocess_emojis_text(self, text, limit_nEmojis=False):
+        """
+            Replace emojis in the raw string of the text with their emotion category,
+            before tokenization, in one scan over the text
 
-            return clean_text
+            Ex.:
+            prep.preprocess_emojis_text("so tired 😭 but ❤️")
+            >> 'so tired  EMOT_SADNESS  but  EMOT_LOVE '
+        """
+        if self.lang == "english":
+            return default_emoji_trie().replace_text(text, limit_nEmojis)
+        return text
 
-        # other language
-        else:
-            return (text)
+    def _edits_preprocess_emojis_text(self, limit_nEmojis=False):
+        if self.lang != "english":
+            return None
+        # the emotion counter of limit_nEmojis needs the whole text
+        if limit_nEmojis is not False:
+            raise ValueError("Preprocessing step preprocess_emojis_text with limit_nEmojis not supported with spans!")
+        trie = default_emoji_trie()
+        return [(trie.pattern, trie.replace_match)]
 
     def preprocess_emoticons(self, text):
         '''
             Replace emoticons in text with their emotion category by searching for
             emoticons with the pattern key word
+
+            Emoticons are looked up in a hash index first, see emoticon_index.py
         '''
 
         if self.lang == "english":
-            clean_text = []
-            for word in text:
-                match_emoticon = Patterns.EMOTICONS_PATTERN.findall(word)
-                if not match_emoticon:  # if no emoticon found
-                    clean_text.append(word)
-                else:
-                    if match_emoticon[0] is not ':':
-                        if match_emoticon[0] is not word:
-                            clean_text.append(word)
-                        else:
-                            try:
-                                clean_text.append(EMOTICONS[word])
-                            except:
-                                print("INFO: Could not replace emoticon: {} of the word: {}".format(match_emoticon[0],
-                                                                                                    word),
-                                      sys.exc_info())
-            return clean_text
+            return _apply_token_function(self._token_preprocess_emoticons(), text)
 
         # other languages
         else:
             return text
 
+    def _token_preprocess_emoticons(self):
+        if self.lang != "english":
+            return None
+
+        # only the tokens containing emoticon characters are searched with the
+        # pattern, once per distinct token
+        index = default_emoticon_index()
+        match_pattern = self.token_cache("preprocess_emoticons").wrap(index.match_pattern)
+        return partial(index.replace_token, match_pattern=match_pattern)
+
     def to_lowercase(self, text):
         """
             Convert all characters to lowercase from list of tokenized words
             Remark: Do it after emotion treatment, otherwise smiley :D -> :d
         """
+        return _apply_token_function(self._token_to_lowercase(), text)
 
-        return [word.lower() if word not in self.Constant_words else word for word in text]
+    def _token_to_lowercase(self):
+        constant_words = frozenset(self.Constant_words)
+
+        def lowercase(word):
+            return word if word in constant_words else word.lower()
+
+        return self.token_cache("to_lowercase").wrap(lowercase)
 
     def remove_non_ascii(self, text):
         """Remove non-ASCII characters from list of tokenized words"""
+        return _apply_token_function(self._token_remove_non_ascii(), text)
+
+    def _token_remove_non_ascii(self):
+        def fold_ascii(word):
+            word = unicodedata.normalize('NFKD', word).encode('ascii', 'ignore').decode('utf-8', 'ignore')
+            return word if word != "" else None
 
-        return [unicodedata.normalize('NFKD', word).encode('ascii', 'ignore').decode('utf-8', 'ignore') \
-                for word in text if
-                unicodedata.normalize('NFKD', word).encode('ascii', 'ignore').decode('utf-8', 'ignore') is not ""]
+        # only the non-ascii words are normalized and cached
+        fold_non_ascii = self.token_cache("remove_non_ascii").wrap(fold_ascii)
+
+        def remove_non_ascii(word):
+            if word.isascii():
+                return word if word != "" else None
+            return fold_non_ascii(word)
+
+        return remove_non_ascii
+
+    def remove_non_ascii_text(self, text):
+        """
+            Remove non-ASCII characters from the whole string of the text, before tokenization
+            ("naïve café" -> "naive cafe")
+
+            Remark: emojis are removed as well, use remove_non_ascii after
+                    preprocess_emojis to keep their emotion category
+        """
+        if text.isascii():
+            return text
+        return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8', 'ignore')
+
+    def _edits_remove_non_ascii_text(self):
+        # NFKD decomposes each character on its own, the runs of non-ascii
+        # characters are folded separately
+        def fold_ascii(match):
+            return unicodedata.normalize('NFKD', match.group()).encode('ascii', 'ignore').decode('utf-8', 'ignore')
+
+        return [(re.compile(r'[^\x00-\x7f]+'), fold_ascii)]
 
     def replace_numbers(self, text, mode="replace"):
         """
             Replace all interger occurrences in list of tokenized words with textual representation
+
+            mode : ("replace", "delete")
+                   if "replace" : numbers are replaced by their textual representation
+                   if "delete" : numbers are deleted
         """
+        return _apply_token_function(self._token_replace_numbers(mode), text)
 
+    def replace_numbers_batch(self, texts, mode="replace"):
+        """
+            Replace numbers in a list of tokenized texts, converting each distinct
+            number of the whole batch only once
+
+            Return
+            ---------------------------------------------------------------
+            list of texts, identical to [replace_numbers(text, mode) for text in texts]
+        """
+        texts = [list(text) for text in texts]
+
+        if mode == "delete":
+            return [[word for word in text if not word.isdigit()] for text in texts]
+        elif mode != "replace":
+            raise ValueError("mode {} not defined!".format(mode))
+
+        number_to_words = self._number_to_words_function()
+        numbers = {word: number_to_words(word) for word in
+                   set(word for text in texts for word in text) if word.isdigit()}
+        if not numbers:
+            return texts
+        return [[numbers.get(word, word) for word in text] for text in texts]
+
+    def get_number_engine(self):
+        """ Return the inflect engine converting numbers to words, created once """
+        if self.Number_Engine is None:
+            self.Number_Engine = inflect.engine()
+        return self.Number_Engine
+
+    def _number_to_words_function(self):
+        # convert each distinct digit string once ("400" -> "four hundred")
+        return self.token_cache("replace_numbers").wrap(self.get_number_engine().number_to_words)
+
+    def _token_replace_numbers(self, mode="replace"):
         if mode == "replace":
-            p = inflect.engine()
-            return [p.number_to_words(word) if word.isdigit() else word for word in text]
+            cached_number_to_words = self._number_to_words_function()
+
+            def number_to_words(word):
+                return cached_number_to_words(word) if word.isdigit() else word
+
+            return number_to_words
 
         elif mode == "delete":
-            return [word for word in text if not word.isdigit()]
+            def delete_number(word):
+                return None if word.isdigit() else word
+
+            return delete_number
+
+        raise ValueError("mode {} not defined!".format(mode))
 
     def remove_stopwords(self, text, include_personal_words=False, include_negations=False,
                          list_stopwords_manual=[]):
@@ -340,53 +898,116 @@ class Preprocess:
                 list_stopwords_manual : list with stopwords that overwrites the default stop lists if given
 
         """
+        stopwords = self.get_stopword_set(include_personal_words, include_negations,
+                                          list_stopwords_manual)
+        if stopwords is None:  # other languages
+            return text
+        return [word for word in text if word not in stopwords]
+
+    def _token_remove_stopwords(self, include_personal_words=False, include_negations=False,
+                                list_stopwords_manual=[]):
+        stopwords = self.get_stopword_set(include_personal_words, include_negations,
+                                          list_stopwords_manual)
+        if stopwords is None:
+            return None
+
+        def check_stopword(word):
+            return None if word in stopwords else word
 
-        new_text = []
+        return check_stopword
 
-        # manual list of stopwords provided
+    def get_stopword_set(self, include_personal_words=False, include_negations=False,
+                         list_stopwords_manual=[]):
+        """
+            Return the frozenset of words removed by remove_stopwords with the
+            given options, None for languages without stopwords
+        """
+
+        # manual list of stopwords provided, converted once per distinct list
         if len(list_stopwords_manual) > 0:
-            return [word for word in text if word not in list_stopwords_manual]
+            key = tuple(list_stopwords_manual)
+            stopwords = self.manual_stopword_sets.get(key)
+            if stopwords is None:
+                stopwords = self.manual_stopword_sets[key] = frozenset(list_stopwords_manual)
+            return stopwords
 
-        else:
-            # english language
-            if self.lang == "english":
+        # english language
+        if self.lang == "english":
+            return Grammar.STOPWORD_SETS_EN[(bool(include_personal_words), bool(include_negations))]
 
-                for word in text:
-
-                    if include_personal_words:
-                        if include_negations:
-                            if (
-                                    word not in Grammar.STOPWORDS_NO_PERSONAL_EN and word not in Grammar.STOPWORDS_CUSTOM) or word in Grammar.WHITELIST_EN:
-                                new_text.append(word)
-                        else:
-                            if word not in Grammar.STOPWORDS_NO_PERSONAL_EN and word not in Grammar.STOPWORDS_CUSTOM:
-                                new_text.append(word)
-                    else:
-                        if include_negations:
-                            if (
-                                    word not in Grammar.STOPWORDS_EN and word not in Grammar.STOPWORDS_CUSTOM) or word in Grammar.WHITELIST_EN:
-                                new_text.append(word)
-                        else:
-                            if word not in Grammar.STOPWORDS_EN and word not in Grammar.STOPWORDS_CUSTOM:
-                                new_text.append(word)
-                return new_text
-
-            # french language
-            elif self.lang == "french":
-                for word in text:
-                    if word not in Grammar.STOPWORDS_FR:
-                        new_text.append(word)
-                return new_text
+        # french language
+        elif self.lang == "french":
+            return Grammar.STOPWORD_SET_FR
 
-            # other languages
-            else:
-                return text
+        # other languages
+        return None
+
+    def get_pos_tagger(self):
+        """
+            Return the part-of-speech tagger, loaded once on first use instead of
+            once per document as done by nltk.pos_tag
+        """
+        if self.POS_Tagger_EN is None:
+            from nltk.tag import PerceptronTagger
+            self.POS_Tagger_EN = PerceptronTagger()
+        return self.POS_Tagger_EN
+
+    def get_lemmatizer(self):
+        """ Return the WordNet lemmatizer, created on first use """
+        if self.WN_Lemmatizer_EN is None:
+            from nltk.stem import WordNetLemmatizer
+            self.WN_Lemmatizer_EN = WordNetLemmatizer()
+        return self.WN_Lemmatizer_EN
 
     def lemmatize_verbs(self, text):
 
         """ Lemmatize verbs in list of tokenized words
         """
 
+        if self.lang == "english":
+
+            # Part-of-speech tagging
+            pos_tags = self.get_pos_tagger().tag(text)
+
+            return self._lemmatize_tagged(pos_tags, self._lemmatize_function())
+
+        else:
+            return text
+
+    def lemmatize_verbs_batch(self, texts):
+        """
+            Lemmatize verbs in a list of tokenized texts, tagging all texts in one call
+
+            Return
+            ---------------------------------------------------------------
+            list of lemmatized texts, identical to [lemmatize_verbs(text) for text in texts]
+        """
+        if self.lang != "english":
+            return list(texts)
+
+        lemmatize = self._lemmatize_function()
+        return [self._lemmatize_tagged(pos_tags, lemmatize)
+                for pos_tags in self.get_pos_tagger().tag_sents(texts)]
+
+    def _lemmatize_function(self):
+        wordnet_lemmatize = self.get_lemmatizer().lemmatize
+        if self.lookup_tables is None:
+            def lemmatize(word_pos):
+                return wordnet_lemmatize(*word_pos)
+        else:
+            # one persistent table per part of speech, NLTK is only called on a miss
+            lemmatizers = {pos: self.lookup_tables.get("lemma", self.lang, "wordnet", pos).wrap(
+                               partial(wordnet_lemmatize, pos=pos))
+                           for pos in "nv"}
+
+            def lemmatize(word_pos):
+                return lemmatizers[word_pos[1]](word_pos[0])
+
+        # lemmatize each distinct (word, pos) pair once
+        return self.token_cache("lemmatize_verbs").wrap(lemmatize)
+
+    def _lemmatize_tagged(self, pos_tags, lemmatize):
+
         # Lemmatization
         def lookup_pos(pos):
             pos_first_char = pos[0].lower()
@@ -395,15 +1016,7 @@ class Preprocess:
             else:
                 return 'n'
 
-        if self.lang == "english":
-
-            # Part-of-speech tagging
-            pos_tags = nltk.pos_tag(text)
-
-            return [self.WN_Lemmatizer_EN.lemmatize(word, lookup_pos(pos)) for (word, pos) in pos_tags]
-
-        else:
-            return text
+        return [lemmatize((word, lookup_pos(pos))) for (word, pos) in pos_tags]
 
     def stem_words(self, text, stemmer=False):
         """ Stem words in list of tokenized words
@@ -426,17 +1039,67 @@ class Preprocess:
                 - Snowball French
         """
 
-        for ind, word in enumerate(text):
-            if word not in self.Constant_words:  # do not change words like USER, URL, EMOT_SMILE,...
-                if stemmer != False:
-                    text[ind] = stemmer.stem(word)
-                elif self.lang == "english":
-                    text[ind] = Grammar.STEMMER_SNOWBALL_EN.stem(word)
-                elif self.lang == "french":
-                    text[ind] = Grammar.STEMMER_SNOWBALL_FR.stem(word)
+        stem = self._token_stem_words(stemmer)
+        if stem is not None:
+            for ind, word in enumerate(text):
+                text[ind] = stem(word)
 
         return text
 
+    def _token_stem_words(self, stemmer=False):
+        if stemmer == False:
+            if self.lang == "english":
+                stemmer = Grammar.STEMMER_SNOWBALL_EN
+            elif self.lang == "french":
+                stemmer = Grammar.STEMMER_SNOWBALL_FR
+            else:
+                return None
+
+        stem_word = stemmer.stem
+        if self.lookup_tables is not None:
+            # one table per stemmer configuration (algorithm and options)
+            stem_word = self.lookup_tables.get("stem", self.lang, stemmer_name(stemmer)).wrap(stem_word)
+
+        constant_words = frozenset(self.Constant_words)
+
+        def stem(word):
+            # do not change words like USER, URL, EMOT_SMILE,...
+            return word if word in constant_words else stem_word(word)
+
+        return self.token_cache(("stem_words", stemmer)).wrap(stem)
+
+    def build_lookup_tables(self, texts, stemmer=False, lemmatize=True):
+        """
+            Fill the persistent stem (and lemma) tables with the vocabulary of the
+            given tokenized texts and save them, so that the next runs skip NLTK
+
+            Parameters
+            -------------------------------------------------------
+            texts :     list of tokenized texts, as given to stem_words / lemmatize_verbs
+            stemmer :   stemmer of stem_words, see stem_words
+            lemmatize : if True, also tag the texts and fill the lemma tables
+        """
+        if self.lookup_tables is None:
+            raise ValueError("Preprocess was created without lookup_dir")
+
+        texts = [list(text) for text in texts]
+        stem = self._token_stem_words(stemmer)
+        if stem is not None:
+            for word in set(word for text in texts for word in text):
+                stem(word)
+        if lemmatize:
+            self.lemmatize_verbs_batch(texts)
+
+        self.save_lookup_tables()
+
+    def save_lookup_tables(self):
+        """
+            Write the words added to the lemma and stem tables to disk, including
+            the words of the worker processes of preprocess_corpus and preprocess_stream
+        """
+        if self.lookup_tables is not None:
+            self.lookup_tables.save()
+
 
 class PreprocesTwitter(Preprocess):
 
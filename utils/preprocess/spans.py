@@ -0,0 +1,329 @@
+"""
+Offset based token spans
+
+In the span mode a preprocessed document is kept as its original text and
+three compact arrays, one entry per token:
+- start, end : offsets of the token in the original text
+- id :         -1 if the token is the original text[start:end], otherwise the
+               index of its replacement string in the table of the document
+               (ex. "cannot", "EMOT_SMILE", lemmas)
+
+The steps working on the whole string (contractions, special words, urls, ...)
+record the places of the text they rewrite, so that the tokens of the
+rewritten text are traced back to their offsets in the original text. Token
+steps update the arrays in place and the token strings are only built at the
+end (TokenSpans.tokens), which gives the same tokens as the list pipeline.
+When the preprocessor profiles its stages (see stage_profiler.py), every step
+runs on its own and is timed under its name, like in pipeline.py.
+
+Ex.:
+pipeline = Preprocess().build_span_pipeline(["replace_contractions", "tokenize",
+                                             "remove_punctuation", "to_lowercase"])
+spans = pipeline("I can't sleep!")
+spans.tokens()
+>> ['i', 'cannot', 'sleep']
+list(spans)
+>> [(0, 1, 'i'), (2, 7, 'cannot'), (8, 13, 'sleep')]
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+import regex
+from nltk.tokenize.casual import ENT_RE, _replace_html_entities
+
+from pipeline import TEXT_STEP, TOKENIZE_STEP, TOKEN_STEP
+
+
+def sub_with_edits(pattern, replace, text):
+    """
+        Replace the matches of the pattern like pattern.sub(replace, text) and
+        record the edits
+
+        Return
+        ---------------------------------------------------------------
+        tuple (new text, edits), edits being None if the text is unchanged,
+        otherwise the arrays (new starts, new ends, old starts, old ends) of the
+        replaced parts of the text, in increasing order
+    """
+    pieces = []
+    new_starts, new_ends, old_starts, old_ends = array("q"), array("q"), array("q"), array("q")
+    last = 0
+    position = 0  # position in the new text
+    for match in pattern.finditer(text):
+        replacement = replace(match)
+        start, end = match.span()
+        if replacement == text[start:end]:
+            continue
+        pieces.append(text[last:start])
+        position += start - last
+        old_starts.append(start)
+        old_ends.append(end)
+        new_starts.append(position)
+        position += len(replacement)
+        new_ends.append(position)
+        pieces.append(replacement)
+        last = end
+
+    if not pieces:
+        return text, None
+    pieces.append(text[last:])
+    return "".join(pieces), (new_starts, new_ends, old_starts, old_ends)
+
+
+def _unescape_entity(match):
+    return _replace_html_entities(match.group())
+
+
+# the tweet tokenizers unescape the html entities of the text and shorten the
+# runs of a character to three characters (nltk's ENT_RE and HANG_RE, ex.
+# "&lt;3!!!!!!" -> "<3!!!") before splitting it, both traced like a text step
+TOKENIZER_EDITS = [(ENT_RE, _unescape_entity),
+                   (regex.compile(r"([^\p{L}\p{N}])\1\1\K\1+"), lambda match: "")]
+
+
+def map_span(edits, start, end):
+    """
+        Return the offsets (start, end) of the span of the new text in the text
+        before the edits, and whether the span overlaps an edit
+    """
+    new_starts, new_ends, old_starts, old_ends = edits
+    # edits before the start, edits starting before the end
+    i = bisect_right(new_ends, start)
+    j = bisect_left(new_starts, end)
+
+    if i < len(new_starts) and new_starts[i] < start:  # start inside a replaced part
+        old_start = old_starts[i]
+    else:
+        old_start = start if i == 0 else old_ends[i - 1] + start - new_ends[i - 1]
+
+    if end == start:  # empty span of a token changed by the tokenizer
+        old_end = old_start
+    elif j > 0 and new_ends[j - 1] > end:  # end inside a replaced part
+        old_end = old_ends[j - 1]
+    else:
+        old_end = end if j == 0 else old_ends[j - 1] + end - new_ends[j - 1]
+
+    return old_start, old_end, i < j
+
+
+class TokenSpans:
+    """
+        Tokens of a document as offsets in its original text
+
+        Parameters
+        -------------------------------------------------------
+        text :    original text
+        starts :  array of the start offsets of the tokens
+        ends :    array of the end offsets of the tokens
+        ids :     array of the replacement ids of the tokens, -1 for original tokens
+        strings : list of the replacement strings of the document, indexed by the ids
+    """
+
+    def __init__(self, text, starts, ends, ids, strings=None):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.ids = ids
+        self.strings = [] if strings is None else strings
+        self._string_ids = {string: i for i, string in enumerate(self.strings)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intern(self, string):
+        """ Return the id of a replacement string, added to the table on first use """
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def __iter__(self):
+        """ Iterate over the tuples (start, end, token) """
+        text, strings = self.text, self.strings
+        for start, end, string_id in zip(self.starts, self.ends, self.ids):
+            yield start, end, text[start:end] if string_id < 0 else strings[string_id]
+
+    def token(self, index):
+        """ Return the string of the token at the given index """
+        string_id = self.ids[index]
+        return self.text[self.starts[index]:self.ends[index]] if string_id < 0 else self.strings[string_id]
+
+    def tokens(self):
+        """ Return the list of the token strings, as given by the list pipeline """
+        text, strings = self.text, self.strings
+        return [text[start:end] if string_id < 0 else strings[string_id]
+                for start, end, string_id in zip(self.starts, self.ends, self.ids)]
+
+    def offsets(self):
+        """ Return the list of the offsets (start, end) of the tokens in the original text """
+        return list(zip(self.starts, self.ends))
+
+    def __repr__(self):
+        return "TokenSpans({!r})".format(list(self))
+
+
+class SpanPipeline:
+    """
+        Preprocessing steps compiled into a single callable returning TokenSpans
+
+        The steps are compiled like in Pipeline: text steps first, which must
+        define the patterns of their replacements (see Preprocess.compile_text_edits),
+        then the tokenization, token steps fused into one loop updating the arrays
+        in place, and document steps keeping the number of tokens (ex. lemmatize_verbs)
+
+        Parameters
+        -------------------------------------------------------
+        preprocessor : Preprocess object whose methods are used
+        steps :        list of preprocessing steps, see Preprocess.resolve_steps
+    """
+
+    def __init__(self, preprocessor, steps=None):
+        self.preprocessor = preprocessor
+
+        profiler = getattr(preprocessor, "profiler", None)
+
+        self.tokenize = None
+        # stages run one after the other, the text steps and the tokenization
+        # on a tuple (original text, rewritten text, list of the edits of each step)
+        stages = []
+        for step, kwargs in preprocessor.resolve_steps(steps):
+            compiled = preprocessor.compile_step(step, kwargs)
+            if compiled is None:
+                continue
+            kind, function = compiled
+            name = getattr(step, "__name__", None) or repr(step)
+            if self.tokenize is None:
+                if kind == TEXT_STEP:
+                    passes = preprocessor.compile_text_edits(step, kwargs)
+                    if passes is not None:
+                        stages.append((name, TEXT_STEP, passes))
+                elif kind == TOKENIZE_STEP:
+                    self.tokenize = function
+                    stages.append((name, TOKENIZE_STEP, [function]))
+                else:
+                    raise ValueError("Preprocessing step {} before tokenize not supported with spans!".format(name))
+            elif kind == TOKEN_STEP:
+                # token steps are fused, unless the steps are profiled one by one
+                if profiler is None and stages[-1][1] == TOKEN_STEP:
+                    stages[-1][2].append(function)
+                else:
+                    stages.append((name, kind, [function]))
+            elif kind in (TEXT_STEP, TOKENIZE_STEP):
+                raise ValueError("Preprocessing step {} after tokenize not supported with spans!".format(name))
+            else:
+                stages.append((name, kind, [function]))
+
+        if self.tokenize is None:
+            raise ValueError("Spans need a tokenize step!")
+        self._runners = []
+        for name, kind, functions in stages:
+            run = self._runner(kind, functions)
+            self._runners.append(run if profiler is None else profiler.wrap(name, run))
+
+    def _runner(self, kind, functions):
+        if kind == TEXT_STEP:
+
+            def run_text(document):
+                text, new_text, layers = document
+                for pattern, replace in functions:
+                    new_text, edits = sub_with_edits(pattern, replace, new_text)
+                    if edits is not None:
+                        layers.append(edits)
+                return text, new_text, layers
+
+            return run_text
+        if kind == TOKENIZE_STEP:
+            return self.trace_tokens
+        if kind == TOKEN_STEP:
+
+            def run_tokens(spans):
+                self.apply_token_functions(spans, functions)
+                return spans
+
+            return run_tokens
+
+        def run_document(spans):
+            self.apply_document_function(spans, functions[0])
+            return spans
+
+        return run_document
+
+    def __call__(self, text):
+        document = (text, text, [])
+        for run in self._runners:
+            document = run(document)
+        return document
+
+    def map(self, texts):
+        """ Run the pipeline on every text and return the list of TokenSpans """
+        return [self(text) for text in texts]
+
+    def trace_tokens(self, document):
+        """
+            Tokenize the rewritten text of a tuple (original text, rewritten text,
+            edits of each text step) and trace the tokens back to the original text
+        """
+        text, new_text, layers = document
+        tokens = self.tokenize(new_text)
+        # the tokens are searched in the text as rewritten by the tokenizer
+        for pattern, replace in TOKENIZER_EDITS:
+            new_text, edits = sub_with_edits(pattern, replace, new_text)
+            if edits is not None:
+                layers = layers + [edits]
+
+        spans = TokenSpans(text, array("q"), array("q"), array("l"))
+        starts, ends, ids, intern = spans.starts, spans.ends, spans.ids, spans.intern
+        position = 0
+        for token in tokens:
+            # a token is only taken after whitespace, not at a later place of
+            # the text: tokens which are not found there get an empty span
+            start = new_text.find(token, position)
+            if start < 0 or (start > position and not new_text[position:start].isspace()):
+                start = end = position
+                changed = True
+            else:
+                end = position = start + len(token)
+                changed = False
+            for edits in reversed(layers):
+                start, end, overlaps = map_span(edits, start, end)
+                changed = changed or overlaps
+            starts.append(start)
+            ends.append(end)
+            ids.append(intern(token) if changed else -1)
+        return spans
+
+    def apply_token_functions(self, spans, functions):
+        """ Run the fused token functions on the spans, compacting the arrays in place """
+        text, strings, intern = spans.text, spans.strings, spans.intern
+        starts, ends, ids = spans.starts, spans.ends, spans.ids
+        kept = 0
+        for index in range(len(ids)):
+            string_id = ids[index]
+            word = text[starts[index]:ends[index]] if string_id < 0 else strings[string_id]
+            new_word = word
+            for function in functions:
+                new_word = function(new_word)
+                if new_word is None:
+                    break
+            else:
+                if new_word != word:
+                    string_id = intern(new_word)
+                starts[kept] = starts[index]
+                ends[kept] = ends[index]
+                ids[kept] = string_id
+                kept += 1
+        del starts[kept:], ends[kept:], ids[kept:]
+
+    def apply_document_function(self, spans, function):
+        """ Run a document function on the tokens of the spans, which must keep their number """
+        tokens = spans.tokens()
+        new_tokens = function(list(tokens))
+        if len(new_tokens) != len(tokens):
+            raise ValueError("Preprocessing step {} changing the number of tokens not supported with spans!"
+                             .format(getattr(function, "__name__", function)))
+        ids = spans.ids
+        for index, (word, new_word) in enumerate(zip(tokens, new_tokens)):
+            if new_word != word:
+                ids[index] = spans.intern(new_word)
@@ -0,0 +1,93 @@
+"""
+Single pass replacement of special words
+
+All the special word lists (long covid words, covid words, ...) are merged in
+one table word -> replacement, compiled into one pattern shaped like a trie of
+the words, ex. "long covid|long-covid|long_covid" -> "long(?: covid|\\-covid|_covid)".
+The text is scanned once whatever the number of lists, taking the leftmost and
+then the longest word at each position.
+Words can be added at runtime, the pattern is only compiled again on the next
+replacement.
+
+Ex.:
+special_words = SpecialWords({"longcovid": ["long covid", "long-covid"], "covid": ["corona"]})
+special_words.add(["long hauler"], "longcovid")
+special_words.replace("long covid and corona, a long hauler")
+>> 'longcovid and covid, a longcovid'
+"""
+
+import re
+
+# key of the trie node marking the end of a word
+_END = ""
+
+
+def _trie_pattern(node, escape, shortest=False):
+    """ Return the regex matching the longest (or shortest) word of the trie node """
+    alternatives = [escape(char) + _trie_pattern(child, escape, shortest)
+                    for char, child in sorted(node.items()) if char != _END]
+    if not alternatives:
+        return ""
+    pattern = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    if _END in node:
+        # the greedy optional group tries the longer words first, the lazy one the shorter
+        optional = "??" if shortest else "?"
+        return "(?:" + pattern + ")" + optional if len(alternatives) == 1 else pattern + optional
+    return pattern
+
+
+def words_pattern(words, escape=re.escape, shortest=False):
+    """
+        Return the regex matching the longest of the given words at a position,
+        shaped like a trie of the words, "" if there is no word
+
+        escape :   function returning the regex of a character
+        shortest : if True, the shortest word is matched first, like the
+                   alternation of the sorted words
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_END] = True
+    return _trie_pattern(trie, escape, shortest)
+
+
+class SpecialWords:
+    """
+        Parameters
+        -------------------------------------------------------
+        word_lists : dict replacement -> list of words replaced by it
+    """
+
+    def __init__(self, word_lists=None):
+        self.replacements = {}
+        self._pattern = None
+        for replacement, words in (word_lists or {}).items():
+            self.add(words, replacement)
+
+    def add(self, words, replacement):
+        """ Replace the words of the list by replacement, a word already in the table is replaced by the new one """
+        for word in words:
+            self.replacements[word] = replacement
+        self._pattern = None
+
+    def remove(self, words):
+        """ Stop replacing the words of the list """
+        for word in words:
+            self.replacements.pop(word, None)
+        self._pattern = None
+
+    @property
+    def pattern(self):
+        """ Pattern matching all the words, compiled on first use after a change of the table """
+        if self._pattern is None:
+            # (?!) never matches, for an empty table
+            self._pattern = re.compile(words_pattern(self.replacements) or "(?!)")
+        return self._pattern
+
+    def replace(self, text):
+        """ Replace all the words of the table in the text """
+        replacements = self.replacements
+        return self.pattern.sub(lambda match: replacements[match.group()], text)
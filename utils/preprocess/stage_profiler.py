@@ -0,0 +1,113 @@
+"""
+Per-stage timing and counters of the preprocessing pipeline
+
+When profiling is enabled (Preprocess(profile=True)), the pipeline runs every
+step on its own instead of fusing the token steps, and records for each stage
+the cumulative wall time, the number of calls and the number of tokens going
+in and out (0 for the texts before tokenization). Without profiling the
+pipeline is compiled as usual and nothing is recorded. The span pipelines
+(see spans.py) are profiled the same way.
+
+Ex.:
+prep = Preprocess(profile=True)
+prep.preprocess_corpus(posts, workers=4)
+prep.print_profile()
+>> stage                  time (s)  time %    calls  tokens in  tokens out
+>> lemmatize_verbs           12.41    61.2   100000    2301233     2301233
+>> tokenize                   3.02    14.9   100000          0     2563120
+>> ...
+prep.profile_stats()      # dict, see StageProfiler.stats
+prep.profiler.to_json("profile.json")
+"""
+
+import json
+from time import perf_counter
+
+from spans import TokenSpans
+
+# recorded counters of a stage, in this order
+COUNTERS = ("time", "calls", "tokens_in", "tokens_out")
+
+
+def _n_tokens(document):
+    """ Return the number of tokens of a list of tokens or TokenSpans, 0 for a text """
+    return len(document) if isinstance(document, (list, TokenSpans)) else 0
+
+
+class StageProfiler:
+    """ Cumulative wall time, calls, tokens in and tokens out of each stage """
+
+    def __init__(self):
+        # stage -> list of the COUNTERS
+        self.stages = {}
+
+    def wrap(self, stage, function):
+        """ Return the function recording its calls under the given stage name """
+        counters = self.stages.setdefault(stage, [0.0, 0, 0, 0])
+
+        def profiled(document):
+            tokens_in = _n_tokens(document)
+            start = perf_counter()
+            document = function(document)
+            counters[0] += perf_counter() - start
+            counters[1] += 1
+            counters[2] += tokens_in
+            counters[3] += _n_tokens(document)
+            return document
+
+        return profiled
+
+    def stats(self):
+        """
+            Return the counters of every stage
+
+            Ex.:
+            profiler.stats()
+            >> {'tokenize': {'time': 3.02, 'calls': 100000, 'tokens_in': 0,
+                             'tokens_out': 2563120, 'time_per_call': 3.02e-05}, ...}
+        """
+        stats = {}
+        for stage, counters in self.stages.items():
+            stats[stage] = dict(zip(COUNTERS, counters))
+            stats[stage]["time_per_call"] = counters[0] / counters[1] if counters[1] else 0.0
+        return stats
+
+    def merge(self, stats):
+        """ Add the counters of stats (ex. of a worker process) to the stages """
+        for stage, values in stats.items():
+            counters = self.stages.setdefault(stage, [0.0, 0, 0, 0])
+            for i, counter in enumerate(COUNTERS):
+                counters[i] += values[counter]
+
+    def clear(self):
+        """ Reset the counters of all stages, keeping the stages of the compiled pipelines """
+        for counters in self.stages.values():
+            counters[:] = [0.0, 0, 0, 0]
+
+    def to_json(self, path=None):
+        """ Return the stats as a JSON string, also written to path if given """
+        stats = json.dumps(self.stats(), indent=2)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(stats)
+        return stats
+
+    def table(self, sort="time"):
+        """
+            Return the stats as a text table, the stages sorted by decreasing
+            value of the given counter ("time", "calls", "tokens_in", "tokens_out",
+            "time_per_call")
+        """
+        stats = self.stats()
+        if sort not in COUNTERS + ("time_per_call",):
+            raise ValueError("sort {} not defined!".format(sort))
+        total_time = sum(values["time"] for values in stats.values()) or 1.0
+        width = max([len("stage")] + [len(stage) for stage in stats])
+
+        lines = ["{:<{w}}  {:>9}  {:>6}  {:>9}  {:>11}  {:>11}".format(
+            "stage", "time (s)", "time %", "calls", "tokens in", "tokens out", w=width)]
+        for stage, values in sorted(stats.items(), key=lambda item: -item[1][sort]):
+            lines.append("{:<{w}}  {:>9.3f}  {:>6.1f}  {:>9}  {:>11}  {:>11}".format(
+                stage, values["time"], 100 * values["time"] / total_time, values["calls"],
+                values["tokens_in"], values["tokens_out"], w=width))
+        return "\n".join(lines)
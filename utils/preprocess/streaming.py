@@ -0,0 +1,166 @@
+"""
+Streaming preprocessing of a corpus too large to be held in memory
+
+Posts are read in chunks of rows (pandas DataFrames) from a CSV file, a JSONL
+file or a MongoDB collection, preprocessed as a stream by
+Preprocess.preprocess_stream and written chunk by chunk, so that memory stays
+the same whatever the size of the corpus.
+
+Ex.:
+prep = Preprocess()
+preprocess_file(prep, "reddit_posts.csv", "reddit_posts_clean.csv",
+                text_column="concatenated_sentences", output_column="clean_text",
+                read_kwargs={"index_col": 0})
+
+# composed by hand, ex. from MongoDB
+chunks = read_mongo_chunks("mongodb://localhost:27017", "reddit", "posts",
+                           projection={"fulltext": 1})
+write_chunks(preprocess_chunks(prep, chunks, "fulltext", workers=4), "posts_clean.jsonl")
+"""
+
+import os
+from collections import deque
+from itertools import islice
+
+import pandas as pd
+
+
+def read_csv_chunks(path, chunksize=10000, **read_kwargs):
+    """ Yield the rows of a CSV file as DataFrames of chunksize rows """
+    with pd.read_csv(path, chunksize=chunksize, **read_kwargs) as reader:
+        yield from reader
+
+
+def read_jsonl_chunks(path, chunksize=10000, **read_kwargs):
+    """ Yield the rows of a JSON lines file as DataFrames of chunksize rows """
+    with pd.read_json(path, lines=True, chunksize=chunksize, **read_kwargs) as reader:
+        yield from reader
+
+
+def read_mongo_chunks(uri, database, collection, query=None, projection=None, chunksize=10000):
+    """
+        Yield the documents of a MongoDB collection matching the query as
+        DataFrames of chunksize rows
+
+        Requires pymongo (pip install pymongo)
+    """
+    try:
+        from pymongo import MongoClient
+    except ImportError:
+        raise ImportError("Reading posts from MongoDB requires pymongo: pip install pymongo")
+
+    with MongoClient(uri) as client:
+        cursor = client[database][collection].find(query or {}, projection, batch_size=chunksize)
+        while True:
+            documents = list(islice(cursor, chunksize))
+            if not documents:
+                return
+            yield pd.DataFrame(documents)
+
+
+def read_chunks(path, chunksize=10000, **read_kwargs):
+    """ Yield the rows of a CSV (.csv) or JSON lines (.jsonl, .json) file as DataFrames """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return read_csv_chunks(path, chunksize, **read_kwargs)
+    if extension in (".jsonl", ".json"):
+        return read_jsonl_chunks(path, chunksize, **read_kwargs)
+    raise ValueError("File format {} not supported! Options: .csv, .jsonl, .json".format(extension))
+
+
+def preprocess_chunks(prep, chunks, text_column, output_column=None, steps=None, workers=1,
+                      chunksize=1000, join=" "):
+    """
+        Preprocess the text column of a stream of DataFrames, yielding each
+        DataFrame with the preprocessed texts once all its rows are done
+
+        Parameters
+        -------------------------------------------------------
+        prep :          Preprocess object
+        chunks :        iterable of DataFrames, ex. read_csv_chunks(path)
+        text_column :   column with the texts to preprocess
+        output_column : column receiving the preprocessed texts. Default: text_column
+        steps :         list of preprocessing steps, see Preprocess.resolve_steps
+        workers :       number of processes, see Preprocess.preprocess_stream
+        chunksize :     number of texts sent at once to a worker process
+        join :          separator joining the tokens of a preprocessed text,
+                        None keeps the list of tokens.
+                        Empty texts (missing values, "") give None
+    """
+    if output_column is None:
+        output_column = text_column
+
+    # DataFrames whose texts were read by the pipeline and are not complete yet
+    pending = deque()
+
+    def texts():
+        for chunk in chunks:
+            pending.append(chunk)
+            for text in chunk[text_column]:
+                # missing values are replaced by None after the pipeline
+                yield text if isinstance(text, str) else ""
+
+    outputs = []
+    for output in prep.preprocess_stream(texts(), steps, workers, chunksize):
+        if join is not None and output is not None and not isinstance(output, str):
+            output = join.join(output)
+        outputs.append(output or None)
+        while pending and len(outputs) >= len(pending[0]):
+            chunk = pending.popleft()
+            chunk[output_column] = outputs[:len(chunk)]
+            del outputs[:len(chunk)]
+            yield chunk
+
+    # remaining empty DataFrames
+    while pending:
+        chunk = pending.popleft()
+        chunk[output_column] = []
+        yield chunk
+
+
+def write_chunks(chunks, path, **write_kwargs):
+    """
+        Write a stream of DataFrames to a CSV (.csv) or JSON lines (.jsonl, .json) file,
+        one chunk after the other
+
+        write_kwargs : keyword arguments of DataFrame.to_csv or DataFrame.to_json
+
+        Return
+        -------------------------------------------------------------
+        number of written rows
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in (".csv", ".jsonl", ".json"):
+        raise ValueError("File format {} not supported! Options: .csv, .jsonl, .json".format(extension))
+
+    n_rows = 0
+    header = True
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            if extension == ".csv":
+                chunk.to_csv(f, header=header, **write_kwargs)
+                header = False
+            elif len(chunk):
+                lines = chunk.to_json(orient="records", lines=True, force_ascii=False, **write_kwargs)
+                f.write(lines if lines.endswith("\n") else lines + "\n")
+            n_rows += len(chunk)
+    return n_rows
+
+
+def preprocess_file(prep, input_path, output_path, text_column, output_column=None, steps=None,
+                    workers=1, chunksize=10000, join=" ", read_kwargs=None, write_kwargs=None):
+    """
+        Preprocess the text column of a CSV or JSON lines file into another file,
+        reading and writing chunksize rows at a time
+
+        See preprocess_chunks for the parameters, read_kwargs and write_kwargs are
+        passed to the pandas readers and writers
+
+        Return
+        -------------------------------------------------------------
+        number of written rows
+    """
+    chunks = read_chunks(input_path, chunksize, **(read_kwargs or {}))
+    chunks = preprocess_chunks(prep, chunks, text_column, output_column, steps, workers,
+                               min(chunksize, 1000), join)
+    return write_chunks(chunks, output_path, **(write_kwargs or {}))
@@ -0,0 +1,39 @@
+"""
+Golden tokens of the tweet tokenizers
+
+golden_tokens.json holds texts and their tokens by nltk's TweetTokenizer, the
+reference of FastTweetTokenizer (see fast_tokenizer.py). Both tokenizers must
+give these tokens, text by text and with tokenize_batch.
+
+Run from the repository root:
+python -m pytest utils/preprocess/tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from nltk.tokenize import TweetTokenizer  # noqa: E402
+
+from fast_tokenizer import FastTweetTokenizer  # noqa: E402
+
+with open(os.path.join(HERE, "golden_tokens.json"), "r", encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+
+TOKENIZERS = {"tweet": TweetTokenizer, "fast": FastTweetTokenizer}
+
+
+@pytest.mark.parametrize("name", sorted(TOKENIZERS))
+@pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+def test_golden_tokens(name, case):
+    assert TOKENIZERS[name]().tokenize(case["text"]) == case["tokens"]
+
+
+def test_fast_tokenize_batch():
+    texts = [case["text"] for case in GOLDEN]
+    assert FastTweetTokenizer().tokenize_batch(texts) == [case["tokens"] for case in GOLDEN]
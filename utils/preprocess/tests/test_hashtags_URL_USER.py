@@ -0,0 +1,51 @@
+"""
+Urls, mentions and hashtags changed in one pass
+
+replace_hashtags_URL_USER gives the same text as when the urls were changed
+first, then the mentions, then the hashtags: a mention or a hashtag glued to a
+url stops where the url starts when the url is deleted, and ends with the URL
+token when the url is replaced.
+
+Run from the repository root:
+python -m pytest utils/preprocess/tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocess import Preprocess  # noqa: E402
+
+# text, (mode_URL, mode_Mentions, mode_Hashtag), expected text
+CASES = [
+    ("#longcovidhttps://t.co/x", ("replace", "keep", "delete"), ""),
+    ("#longcovidhttps://t.co/x", ("replace", "keep", "replace"), "longcovidURL"),
+    ("#longcovidhttps://t.co/x", ("delete", "keep", "delete"), ""),
+    ("#longcovidhttps://t.co/x more", ("delete", "keep", "replace"), "longcovid more"),
+    ("@bobhttps://t.co/x", ("replace", "delete", "keep"), ""),
+    ("@bobhttps://t.co/x", ("replace", "replace", "keep"), "USER"),
+    ("@bobhttps://t.co/x", ("replace", "screen_name", "keep"), "bobURL"),
+    ("#https://t.co/x and #http", ("replace", "keep", "delete"), " and "),
+    ("@Obama loves #stackoverflow, check https://t.co/z2zdz1uYsd", ("replace", "replace", "replace"),
+     "USER loves stackoverflow, check URL"),
+]
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return Preprocess()
+
+
+@pytest.mark.parametrize("text, modes, expected", CASES)
+def test_replace_hashtags_URL_USER(preprocessor, text, modes, expected):
+    mode_URL, mode_Mentions, mode_Hashtag = modes
+    assert preprocessor.replace_hashtags_URL_USER(text, mode_URL=mode_URL, mode_Mentions=mode_Mentions,
+                                                  mode_Hashtag=mode_Hashtag) == expected
+
+
+def test_mode_not_defined(preprocessor):
+    with pytest.raises(ValueError):
+        preprocessor.replace_hashtags_URL_USER("#tag", mode_Hashtag="strip")
@@ -0,0 +1,78 @@
+"""
+Bounded cache for per-token preprocessing stages
+
+A corpus contains far fewer distinct words than tokens, so the result of
+lowercasing, ascii folding, stemming or lemmatizing a word is computed once
+and looked up for the following occurrences.
+The least recently used words are evicted once the cache is full, so that it
+does not grow without limit on streaming workloads.
+"""
+
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+        Least recently used cache from a token to the result of a stage
+
+        Parameters
+        -------------------------------------------------------
+        maxsize : maximal number of cached tokens, 0 disables the cache
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def wrap(self, function):
+        """
+            Return function(token) computed once per distinct token
+
+            Ex.:
+            cache = TokenCache(1000)
+            stem = cache.wrap(Grammar.STEMMER_SNOWBALL_EN.stem)
+            [stem(word) for word in ["running", "runs", "running"]]
+            >> ['run', 'run', 'run']   # computed twice, looked up once
+        """
+        if not self.maxsize:
+            return function
+
+        data = self._data
+        move_to_end = data.move_to_end
+        popitem = data.popitem
+        maxsize = self.maxsize
+
+        def cached_function(token):
+            try:
+                value = data[token]
+            except KeyError:
+                self.misses += 1
+                value = data[token] = function(token)
+                if len(data) > maxsize:
+                    popitem(last=False)  # evict the least recently used token
+                return value
+            self.hits += 1
+            move_to_end(token)
+            return value
+
+        return cached_function
+
+    def clear(self):
+        """ Remove all cached tokens and reset the statistics """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """ Return a dict with the hits, misses, size, maxsize and hit rate of the cache """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1 @@
+# this file makes the directory a python package
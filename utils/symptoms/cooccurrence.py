@@ -0,0 +1,124 @@
+"""
+Sparse indicator matrices of the symptoms found in the posts and their co-occurrences
+
+The initial insights notebook counted the co-occurring symptoms (and
+categories) of the posts by listing every pair (i, j) of every post and
+counting the flattened list with collections.Counter. Here the symptoms of the
+posts are a CSR indicator matrix X (posts x symptoms, 1 if the post mentions
+the symptom) and
+- the number of posts mentioning each symptom is the sum of the columns of X
+- the co-occurrences are the sparse product X.T @ X, whose diagonal holds
+  the number of posts of each symptom
+- the top pairs are selected with np.argpartition over the upper triangle
+
+Ex.:
+X, symptoms = extractor.indicator_matrix(posts)
+counts = marginal_counts(X)
+C = cooccurrence_matrix(X)
+top_pairs(C, 10, symptoms)
+>> [(('fatigue', 'pain'), 1325), (('anxiety', 'fatigue'), 1102), ...]
+
+# columns and categories of the compiled lexicon, see lexicon.py
+X, symptoms = extractor.indicator_matrix(posts, lexicon.symptoms.tolist())
+X_categories = category_matrix(X, lexicon.symptom_category, len(lexicon.categories))
+top_pairs(cooccurrence_matrix(X_categories), 10, lexicon.categories.tolist())
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+def indicator_matrix(rows, n_columns):
+    """
+        Return the CSR indicator matrix (len(rows) x n_columns, int32) of lists of column ids,
+        the ids repeated in a row counted once
+
+        Ex.:
+        indicator_matrix([[0, 2], [], [2, 2, 1]], 3).toarray()
+        >> [[1, 0, 1], [0, 0, 0], [0, 1, 1]]
+    """
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indices = []
+    for i, row in enumerate(rows):
+        row = sorted(set(row))
+        indices.extend(row)
+        indptr[i + 1] = indptr[i] + len(row)
+    indices = np.array(indices, dtype=np.int32)
+    data = np.ones(len(indices), dtype=np.int32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), n_columns))
+
+
+def category_matrix(X, column_category, n_categories=None):
+    """
+        Return the CSR indicator matrix posts x categories of an indicator
+        matrix posts x symptoms
+
+        column_category : array of the category id of each column of X, -1 for
+                          the columns without category
+    """
+    column_category = np.asarray(column_category)
+    if n_categories is None:
+        n_categories = int(column_category.max()) + 1 if len(column_category) else 0
+    columns = np.flatnonzero(column_category >= 0)
+    # one-hot matrix symptoms x categories
+    M = sparse.csr_matrix((np.ones(len(columns), dtype=np.int32), (columns, column_category[columns])),
+                          shape=(len(column_category), n_categories))
+    X_categories = (X @ M).tocsr()
+    X_categories.data[:] = 1
+    return X_categories
+
+
+def marginal_counts(X):
+    """ Return the number of posts (rows) of each symptom (column) """
+    return np.asarray(X.sum(axis=0)).ravel()
+
+
+def cooccurrence_matrix(X, keep_diagonal=False):
+    """
+        Return the CSR matrix of the number of posts mentioning both symptoms
+        of each pair, X.T @ X
+
+        keep_diagonal : if True, the diagonal holds the number of posts of each symptom,
+                        otherwise it is removed like the pairs (i, i) of the notebook
+    """
+    X = sparse.csr_matrix(X)
+    C = (X.T @ X).tocsr()
+    if not keep_diagonal:
+        C.setdiag(0)
+        C.eliminate_zeros()
+    return C
+
+
+def top_pairs(C, k=10, labels=None):
+    """
+        Return the k pairs (i, j), i < j, with the most co-occurrences, as a list
+        of ((i, j), count) sorted by decreasing count like Counter.most_common,
+        i and j being replaced by their labels if given
+    """
+    upper = sparse.triu(C, k=1).tocoo()
+    counts = upper.data
+    if k < len(counts):
+        selected = np.argpartition(-counts, k)[:k]
+    else:
+        selected = np.arange(len(counts))
+    # decreasing counts, then the order of the pairs for the same count
+    selected = selected[np.lexsort((upper.col[selected], upper.row[selected], -counts[selected]))]
+
+    pairs = []
+    for i, j, count in zip(upper.row[selected].tolist(), upper.col[selected].tolist(),
+                           counts[selected].tolist()):
+        pairs.append(((labels[i], labels[j]) if labels is not None else (i, j), count))
+    return pairs
+
+
+def cooccurrence_percentages(C, counts):
+    """
+        Return the dense matrix of the percentage of the posts of the symptom
+        of each row which also mention the symptom of the column, as in the
+        co-occurrence heatmaps of the notebook
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentages = C.toarray() / counts[:, np.newaxis] * 100
+    percentages[counts == 0] = 0
+    return percentages
@@ -0,0 +1,135 @@
+"""
+Single pass extraction of the lexicon symptoms from the posts
+
+The initial insights notebook searched every entry of the symptom lexicon
+(symptoms, UMLS terms and synonyms) with re.search(fr'\\b{symptom}\\b', text),
+taking the terms with the most words first and deleting each found term from
+the text so that the shorter terms inside it are not found again.
+
+SymptomExtractor compiles all the terms into a character trie. A post is
+scanned once: from every word boundary the trie gives all the terms starting
+there and ending at a word boundary. Overlapping terms are then resolved like
+in the notebook, the terms with the most words win (for terms with the same
+number of words, the leftmost and then the longest).
+
+Ex.:
+lexicon_symptoms_dict = load_lexicon("lexicon_symptoms_dict_named.json")
+extractor = SymptomExtractor(lexicon_symptoms_dict)
+extractor.extract("chronic fatigue and chest pain, pain everywhere")
+>> [(0, 15, 'chronic fatigue'), (20, 30, 'chest pain'), (32, 36, 'pain')]
+extractor.symptoms("chronic fatigue and chest pain, pain everywhere")
+>> ['chronic fatigue', 'chest pain', 'pain']
+extractor.lexicon_symptoms("chronic fatigue and chest pain, pain everywhere")
+>> ['fatigue', 'chest pain', 'pain']
+X, symptoms = extractor.indicator_matrix(posts)   # CSR posts x symptoms, see cooccurrence.py
+"""
+
+import ast
+import re
+
+from cooccurrence import indicator_matrix
+
+# key of the trie node holding the term ending there
+_END = ""
+
+_BOUNDARY_RE = re.compile(r"\b")
+
+
+def load_lexicon(path):
+    """ Read a dictionary term -> lexicon symptom (or category) saved as in the notebooks """
+    with open(path, "r", encoding="utf-8") as f:
+        return ast.literal_eval(f.read())
+
+
+class SymptomExtractor:
+    """
+        Parameters
+        -------------------------------------------------------
+        lexicon : dict term -> lexicon symptom (ex. lexicon_symptoms_dict of
+                  the notebooks), or list of terms mapped to themselves
+    """
+
+    def __init__(self, lexicon):
+        if not isinstance(lexicon, dict):
+            lexicon = {term: term for term in lexicon}
+        self.lexicon = {}
+        self.trie = {}
+        for term, symptom in lexicon.items():
+            if term:
+                self.add(term, symptom)
+
+    def add(self, term, symptom=None):
+        """ Add a term to the extractor, mapped to the lexicon symptom (default: itself) """
+        self.lexicon[term] = term if symptom is None else symptom
+        node = self.trie
+        for char in term:
+            node = node.setdefault(char, {})
+        # the number of words of the term ranks the overlapping matches
+        node[_END] = (term, len(term.split()))
+
+    def candidates(self, text):
+        """
+            Return all the terms of the text starting and ending at a word
+            boundary, as tuples (start, end, term, number of words), overlapping included
+        """
+        positions = [match.start() for match in _BOUNDARY_RE.finditer(text)]
+        boundaries = set(positions)
+        trie = self.trie
+        candidates = []
+        for start in positions:
+            node = trie
+            for end in range(start, len(text)):
+                node = node.get(text[end])
+                if node is None:
+                    break
+                found = node.get(_END)
+                if found is not None and end + 1 in boundaries:
+                    candidates.append((start, end + 1) + found)
+        return candidates
+
+    def extract(self, text):
+        """
+            Return the terms of the text as tuples (start, end, term) in the order
+            of the text, overlapping terms resolved like in the notebook: the terms
+            with the most words first, then the leftmost, then the longest
+        """
+        candidates = self.candidates(text)
+        candidates.sort(key=lambda candidate: (-candidate[3], candidate[0], candidate[0] - candidate[1]))
+
+        # characters of the text taken by the selected terms
+        taken = bytearray(len(text))
+        matches = []
+        for start, end, term, _ in candidates:
+            if not any(taken[start:end]):
+                taken[start:end] = b"\x01" * (end - start)
+                matches.append((start, end, term))
+        matches.sort()
+        return matches
+
+    def symptoms(self, text):
+        """ Return the distinct terms found in the text, in the order of the text """
+        return list(dict.fromkeys(term for _, _, term in self.extract(text)))
+
+    def lexicon_symptoms(self, text):
+        """ Return the distinct lexicon symptoms of the terms found in the text, in the order of the text """
+        lexicon = self.lexicon
+        return list(dict.fromkeys(lexicon[term] for _, _, term in self.extract(text)))
+
+    def extract_corpus(self, texts):
+        """ Return the list of the distinct terms found in each text, see symptoms """
+        return [self.symptoms(text) for text in texts]
+
+    def indicator_matrix(self, texts, columns=None):
+        """
+            Return the CSR indicator matrix texts x lexicon symptoms and the list
+            of the symptoms of its columns, see cooccurrence.py
+
+            columns : lexicon symptoms of the columns, ex. lexicon.symptoms.tolist()
+                      of the compiled lexicon. Default: all the symptoms, sorted
+        """
+        if columns is None:
+            columns = sorted(set(self.lexicon.values()))
+        column_ids = {symptom: i for i, symptom in enumerate(columns)}
+        rows = [[column_ids[symptom] for symptom in self.lexicon_symptoms(text) if symptom in column_ids]
+                for text in texts]
+        return indicator_matrix(rows, len(columns)), columns
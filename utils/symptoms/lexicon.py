@@ -0,0 +1,447 @@
+"""
+Compiled artifact of the symptom lexicon and of its categorisation
+
+lexicon_symptoms_categories_mapping.ipynb maps every synonym of the lexicon
+(symptom names, UMLS concepts and synonyms) to a single symptom and every
+symptom to its category, saved as json dictionaries read back with
+ast.literal_eval by the analysis notebooks. The same mapping is built here
+from the two CSV files into one binary file holding integer arrays and string
+tables, which the loader memory-maps, so that every job and worker process
+shares the same pages instead of parsing large dictionaries:
+- synonym_symptom :  symptom id of each synonym
+- symptom_category : category id of each symptom, -1 if it has none
+- synonyms, symptoms, categories : string tables of the ids. The symptom ids
+  are the rows of the lexicon CSV, as in lexicon_symptoms_dict_numbered
+
+The file stores the checksum of the two CSV files and is built again on load
+when they change.
+
+Build the artifact:
+python lexicon.py post_covid19_symptom_lexicon.csv "Symptoms Categorisation.csv" [path]
+
+Ex.:
+lexicon = load_symptom_lexicon()
+lexicon.symptom_of("passed out"), lexicon.category_of("passed out")
+>> ('loss of consciousness', 'Neurological/Ocular ')
+extractor = SymptomExtractor(lexicon.lexicon_symptoms_dict_named())
+"""
+
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+
+import numpy as np
+
+# version of the artifact format and of the mapping, changing it forces a rebuild
+ARTIFACT_VERSION = 1
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symptom_lexicon.bin")
+
+# start of the file, followed by the length of the json header
+MAGIC = b"SYMLEX\x00\x00"
+# arrays are aligned on this number of bytes
+_ALIGNMENT = 8
+
+# names of the lexicon symptoms fixed by hand, by row of the lexicon CSV
+SYMPTOM_NAME_FIXES = {
+    315: "postcoital bleeding",  # 'postcoital\xa0bleeding'
+}
+
+# synonyms still mapped to several symptoms after keeping the symptom of the
+# same name, mapped to the closest symptom in meaning (row of the lexicon CSV)
+SYNONYM_OVERRIDES = {
+    'dull pain': 0,  # pain instead of chest pain
+    'neurotic depression': 2,  # depression instead of dysthymia
+    'break-through bleeding': 93,  # vaginal bleeding instead of bleeding
+    'abdominal cramps': 17,  # abdominal pain instead of pain
+    'numbness': 165,  # hypesthesia instead of paresthesia
+    'decreased urine output': 301,  # oliguria instad of lower urinary tract symptoms
+    'respiratory arrest': 40,  # respiratory depression instead of sleep apnea
+    'rigor': 42,  # chills instead of muscle stiffness
+    'confusional state': 45,  # confusion instead of mental status change
+    'collapse': 52,  # syncope instead of anaphylaxis
+    'hematochezia': 64,  # gastrointestinal hemorrhage instead of blood in stools
+    'melena': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'sinus pain': 79,  # facial pain instead of headaches
+    'ulceration': 22,  # skin lesion instead of ulcer
+    'myofascial pain': 8,  # myalgia instead of musculoskeletal pain
+    'blood in stool': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'dysphonia': 119,  # hoarseness instead of difficulty speaking
+    'motor restlessness': 305,  # akathisia instead of restlessness
+    'crampy abdominal pain': 17,  # abdominal pain instead of pain
+    'oral pain': 0,  # pain instead of facial pain
+    'depressive neurosis': 2,  # depression instead of dysthymia
+    'feel bad': 205,  # feeling bad
+    'feel ill': 205,  # feeling bad instead of fatigue
+    'breathing difficulties': 5,  # shortness of breath instead of respiratory depression
+    'difficulty breathing': 5,  # shortness of breath instead of respiratory depression
+    'respiratory difficulties': 5,  # shortness of breath instead of respiratory depression
+    'vomiting blood': 64,  # gastrointestinal hemorrhage instead of nausea and/or vomiting
+    'facial puffiness': 198,  # facial edema instead of swelling
+    'bleeding breakthrough': 93,  # vaginal bleeding instead of bleeding
+    'bleeding diathesis': 156,  # tendency to bleed instead of bleeding
+    'bleeding disorder': 156,  # tendency to bleed instead of bleeding
+    'bleeding disorders': 156,  # tendency to bleed instead of bleeding
+    'bleeding tendency': 156,  # tendency to bleed instead of bleeding
+    'breakthrough bleeding': 93,  # vaginal bleeding instead of bleeding
+    'intermenstrual bleeding': 93,  # vaginal bleeding instead of bleeding
+    'spotting between menses': 93,  # vaginal bleeding instead of bleeding
+    'wooziness': 18,  # dizziness or vertigo instead of clouded consciousness
+    'paresis': 116,  # muscle weakness instead of weakness
+    'peeling': 22,  # skin lesion instead of skin irritation
+    'skin breakdown': 173,  # impaired skin integrity instead of skin lesion
+    'spots': 22,  # skin lesion instead of rash
+    'ulcerated': 81,  # ulcer instead of skin lesion
+    'ulcerating': 81,  # ulcer instead of skin lesion
+    'ulceration, nos': 81,  # ulcer instead of skin lesion
+    'disturbances, sleep': 57,  # sleep disorder instead of insomnia
+    'sleep disturbance': 57,  # sleep disorder instead of insomnia
+    'sleep disturbances': 57,  # sleep disorder instead of insomnia
+    'acquired lymphedema': 249,  # lymphedema instead of peripheral edema
+    'acquired lymphoedema': 249,  # lymphedema instead of peripheral edema
+    'urine output decreased': 301,  # oliguria instead of lower urinary tract symptoms
+    'urine output low': 301,  # oliguria instead of lower urinary tract symptoms
+    'urine production scanty': 301,  # oliguria instead of lower urinary tract symptoms
+    'urine volume deficient': 301,  # oliguria instead of lower urinary tract symptoms
+    'volume urine decreased': 301,  # oliguria instead of lower urinary tract symptoms
+    'excess fluid': 109,  # fluid retention instead of edema
+    'blocked nose': 223,  # nasal obstruction insetad of sinonasal congestion
+    'difficulties gait': 39,  # abnormal gait instead of walking disability
+    'gait difficulty': 39,  # abnormal gait instead of walking disability
+    'limited mobility': 179,  # reduced mobility instead of abnormal gait
+    'pulmonary arrest': 40,  # respiratory depression instead of sleep apnea
+    'loss of vision': 129,  # blindness instead of visual changes
+    'vision loss': 129,  # blindness instead of visual changes
+    'acute confusional state': 45,  # confusion instead of mental status change
+    'bewilderment': 45,  # confusion instead of clouded consciousness
+    'dazed': 45,  # confusion instead of clouded consciousness
+    'dazed state': 45,  # confusion instead of clouded consciousness
+    'muddled': 45,  # confusion instead of clouded consciousness
+    'blackout': 107,  # loss of consciousness instead of syncope
+    'pass out': 107,  # loss of consciousness instead of syncope
+    'passed out': 107,  # loss of consciousness instead of syncope
+    'passing out': 107,  # loss of consciousness instead of syncope
+    'black faeces': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'black faeces symptom': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'black feces': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'black feces symptom': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'black stool': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'black stools': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'blood in faeces': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'blood in feces': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'bloody stool': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'dark stools': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'faeces: blood': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'feces: blood': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'haematochezia': 64,  # gastrointestinal hemorrhage instead of blood in stools
+    'melaena': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'passage of bloody stools': 99,  # blood in stools instead of gastrointestinal hemorrhage
+    'stool black': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'stool tarry': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'tarry stool': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'tarry stools': 181,  # feces color: tarry instead of gastrointestinal hemorrhage
+    'excessive overactivity': 158,  # psychomotor agitation instead of agitation
+    'excessive overactivity, nos': 158,  # psychomotor agitation instead of agitation
+    'increased purposeless goalless activity': 158,  # psychomotor agitation instead of agitation
+    'increased purposeless goalless activity, nos': 158,  # psychomotor agitation instead of agitation
+    'restless': 128,  # restlessness instead of agitation
+    'restlessness marked': 128,  # restlessness instead of agitation
+    'unable to keep still': 128,  # restlessness instead of agitation
+    'hair thinning': 75,  # hair loss instead of hypotrichosis
+    'affective psychosis nos': 145,  # psychosis instead of mood swings
+    'muscle spasm': 88,  # spasm instead of myotonia
+    'dysfunctional uterine bleeding': 139,  # abnormal uterine bleeding instead of vaginal bleeding
+    'spotting': 127,  # menstrual spotting instead of vaginal bleeding
+    'cold feel': 278,  # feels cold instead of temperature intolerance
+    'cold feelings': 278,  # feels cold instead of temperature intolerance
+    'feel cold': 278,  # feels cold instead of temperature intolerance
+    'jerk': 243,  # twitching instead of muscle twitching
+    'jerking': 243,  # twitching instead of muscle twitching
+    'manic': 207,  # manic mood instead of mania
+    'swollen throat': 280,  # throat swelling instead of oropharyngeal swelling
+}
+
+
+def sources_checksum(lexicon_csv, categorisation_csv):
+    """ Return the sha256 of the two CSV files and of the artifact version """
+    sha = hashlib.sha256(str(ARTIFACT_VERSION).encode("utf-8"))
+    for path in (lexicon_csv, categorisation_csv):
+        with open(path, "rb") as f:
+            sha.update(hashlib.sha256(f.read()).digest())
+    return sha.hexdigest()
+
+
+def map_synonyms(lexicon):
+    """
+        Map every synonym of the lexicon DataFrame to a single symptom row,
+        like lexicon_symptoms_dict_numbered of the mapping notebook
+
+        Return
+        ---------------------------------------------------------------
+        tuple (list of the symptom names, dict synonym -> symptom row)
+    """
+    symptom_names = [symptom.strip() for symptom in lexicon.symptom.to_list()]
+    for row, name in SYMPTOM_NAME_FIXES.items():
+        if row < len(symptom_names):
+            symptom_names[row] = name
+
+    # symptom names, then the UMLS concepts without their codes and the synonyms of each row
+    synonyms = list(zip(symptom_names, lexicon.index))
+    for row, concepts in zip(lexicon.index, lexicon.consolidated_UMLS_concepts):
+        synonyms.extend((concept.lower(), row) for concept in re.sub(r'C[0-9]*:', '', concepts).split('|'))
+    for row, row_synonyms in zip(lexicon.index, lexicon.synonyms):
+        synonyms.extend((synonym.lower(), row) for synonym in row_synonyms.split('|'))
+
+    rows = {}
+    for synonym, row in synonyms:
+        rows.setdefault(synonym, []).append(row)
+    # same order of the rows as the notebook, where the first one is kept
+    rows = {synonym: list(set(synonym_rows)) for synonym, synonym_rows in rows.items()}
+
+    # a synonym which is also the name of one of its symptoms is mapped to it
+    raw_names = lexicon.symptom.to_list()
+    for synonym, synonym_rows in rows.items():
+        for row in synonym_rows:
+            if raw_names[row] == synonym:
+                rows[synonym] = [row]
+                break
+
+    for synonym, row in SYNONYM_OVERRIDES.items():
+        rows[synonym] = [row]
+
+    return symptom_names, {synonym: synonym_rows[0] for synonym, synonym_rows in rows.items()}
+
+
+def map_categories(categorisation):
+    """ Return the dict symptom -> category of the categorisation DataFrame, like the mapping notebook """
+    symptom_category = {}
+    for category, symptoms in zip(categorisation['Category'], categorisation['Symptoms']):
+        for symptom in symptoms.replace("'", '').split(','):
+            symptom = symptom.strip()
+            if symptom != '':
+                symptom_category[symptom] = category
+    return symptom_category
+
+
+class StringTable:
+    """
+        Table of strings stored as the utf-8 bytes of all the strings and the
+        offsets of each string, decoded on access
+
+        Parameters
+        -------------------------------------------------------
+        offsets : int64 array of n + 1 byte offsets
+        data :    uint8 array of the concatenated strings
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self._ids = None
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def tolist(self):
+        """ Return all the strings """
+        data = bytes(self.data)
+        offsets = self.offsets.tolist()
+        return [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def index(self, string):
+        """ Return the id of the string, the dict string -> id being built on first use """
+        if self._ids is None:
+            self._ids = {value: i for i, value in enumerate(self.tolist())}
+        return self._ids[string]
+
+
+class SymptomLexicon:
+    """
+        Mapping synonym -> symptom -> category as integer arrays and string tables
+
+        Parameters
+        -------------------------------------------------------
+        synonyms, symptoms, categories : StringTable of each id
+        synonym_symptom :  int32 array, symptom id of each synonym
+        symptom_category : int32 array, category id of each symptom, -1 if it has none
+        checksum :         checksum of the CSV files the lexicon was built from
+        path :             file the lexicon was loaded from, None if built in memory
+        mmap :             whether the arrays of the file are memory-mapped
+    """
+
+    def __init__(self, synonyms, symptoms, categories, synonym_symptom, symptom_category,
+                 checksum=None, path=None, mmap=True):
+        self.synonyms = synonyms
+        self.symptoms = symptoms
+        self.categories = categories
+        self.synonym_symptom = synonym_symptom
+        self.symptom_category = symptom_category
+        self.checksum = checksum
+        self.path = path
+        self.mmap = mmap
+
+    @classmethod
+    def build(cls, lexicon_csv, categorisation_csv):
+        """ Build the mapping of the mapping notebook from the lexicon CSV and the categorisation CSV """
+        import pandas as pd
+
+        symptom_names, synonym_rows = map_synonyms(pd.read_csv(lexicon_csv))
+        symptom_category = map_categories(pd.read_csv(categorisation_csv))
+
+        categories = list(dict.fromkeys(symptom_category.values()))
+        category_ids = {category: i for i, category in enumerate(categories)}
+        symptom_category_ids = np.array([category_ids.get(symptom_category.get(name), -1)
+                                         for name in symptom_names], dtype=np.int32)
+        for synonym, row in synonym_rows.items():
+            if symptom_category_ids[row] < 0:
+                raise ValueError("Category of symptom {} (synonym {}) not defined!".format(
+                    symptom_names[row], synonym))
+
+        return cls(StringTable.from_strings(synonym_rows), StringTable.from_strings(symptom_names),
+                   StringTable.from_strings(categories),
+                   np.array(list(synonym_rows.values()), dtype=np.int32), symptom_category_ids,
+                   sources_checksum(lexicon_csv, categorisation_csv))
+
+    def _arrays(self):
+        arrays = {"synonym_symptom": self.synonym_symptom, "symptom_category": self.symptom_category}
+        for name in ("synonyms", "symptoms", "categories"):
+            table = getattr(self, name)
+            arrays[name + "_offsets"] = table.offsets
+            arrays[name + "_data"] = table.data
+        return arrays
+
+    def save(self, path=DEFAULT_PATH):
+        """ Write the lexicon, replacing the previous file at once """
+        arrays = {name: np.ascontiguousarray(array) for name, array in self._arrays().items()}
+        header = {"version": ARTIFACT_VERSION, "checksum": self.checksum, "arrays": {}}
+        offset = 0
+        for name, array in arrays.items():
+            header["arrays"][name] = [array.dtype.str, offset, len(array)]
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        header = json.dumps(header).encode("utf-8")
+        header += b" " * (-(len(MAGIC) + 8 + len(header)) % _ALIGNMENT)
+
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for array in arrays.values():
+                f.write(array.tobytes())
+                f.write(b"\x00" * (-array.nbytes % _ALIGNMENT))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_header(path):
+        """ Return the json header of the file and the offset of its arrays """
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("File {} is not a symptom lexicon!".format(path))
+            length, = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length).decode("utf-8"))
+        return header, len(MAGIC) + 8 + length
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH, mmap=True):
+        """
+            Load the lexicon of the file, its arrays memory-mapped read-only if
+            mmap is True (shared by all the processes reading the file),
+            otherwise read in memory
+        """
+        header, start = cls.read_header(path)
+        if header.get("version") != ARTIFACT_VERSION:
+            raise ValueError("Symptom lexicon version {} not supported!".format(header.get("version")))
+
+        arrays = {}
+        with open(path, "rb") as f:
+            for name, (dtype, offset, length) in header["arrays"].items():
+                if mmap and length:
+                    arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=start + offset, shape=(length,))
+                else:
+                    f.seek(start + offset)
+                    arrays[name] = np.fromfile(f, dtype=dtype, count=length)
+
+        tables = [StringTable(arrays[name + "_offsets"], arrays[name + "_data"])
+                  for name in ("synonyms", "symptoms", "categories")]
+        return cls(*tables, arrays["synonym_symptom"], arrays["symptom_category"],
+                   header.get("checksum"), path, mmap)
+
+    def __reduce__(self):
+        # worker processes map the file again instead of receiving the arrays
+        if self.path is not None:
+            return self.__class__.load, (self.path, self.mmap)
+        return super().__reduce__()
+
+    def symptom_of(self, synonym):
+        """ Return the lexicon symptom of a synonym """
+        return self.symptoms[self.synonym_symptom[self.synonyms.index(synonym)]]
+
+    def category_of(self, synonym):
+        """ Return the category of the symptom of a synonym """
+        return self.categories[self.symptom_category[self.synonym_symptom[self.synonyms.index(synonym)]]]
+
+    def lexicon_symptoms_dict_numbered(self):
+        """ Return the dict synonym -> symptom row of the notebooks """
+        return dict(zip(self.synonyms.tolist(), self.synonym_symptom.tolist()))
+
+    def lexicon_symptoms_dict_named(self):
+        """ Return the dict synonym -> symptom name of the notebooks """
+        symptoms = self.symptoms.tolist()
+        return {synonym: symptoms[row] for synonym, row in
+                zip(self.synonyms.tolist(), self.synonym_symptom.tolist())}
+
+    def symptom_synonym_category_dict(self):
+        """ Return the dict synonym -> category of the notebooks """
+        categories = self.categories.tolist()
+        symptom_category = self.symptom_category.tolist()
+        return {synonym: categories[symptom_category[row]] for synonym, row in
+                zip(self.synonyms.tolist(), self.synonym_symptom.tolist())}
+
+
+def load_symptom_lexicon(path=DEFAULT_PATH, lexicon_csv=None, categorisation_csv=None, mmap=True):
+    """
+        Return the lexicon stored at path. If the CSV files are given, the
+        lexicon is built from them and saved first if the file is missing or
+        was built from other files
+    """
+    if lexicon_csv is None or categorisation_csv is None:
+        return SymptomLexicon.load(path, mmap)
+
+    checksum = sources_checksum(lexicon_csv, categorisation_csv)
+    if os.path.exists(path):
+        try:
+            header, _ = SymptomLexicon.read_header(path)
+        except ValueError:
+            header = {}
+        if header.get("version") == ARTIFACT_VERSION and header.get("checksum") == checksum:
+            return SymptomLexicon.load(path, mmap)
+
+    lexicon = SymptomLexicon.build(lexicon_csv, categorisation_csv)
+    try:
+        lexicon.save(path)
+    except OSError as e:  # read-only installation, the lexicon is kept in memory
+        print("INFO: Could not save the symptom lexicon to {}: {}".format(path, e))
+        return lexicon
+    return SymptomLexicon.load(path, mmap)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python lexicon.py LEXICON_CSV CATEGORISATION_CSV [PATH]")
+        sys.exit(1)
+    path = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_PATH
+    lexicon = SymptomLexicon.build(sys.argv[1], sys.argv[2])
+    lexicon.save(path)
+    print("Saved {} synonyms of {} symptoms in {} categories to {}".format(
+        len(lexicon.synonyms), len(lexicon.symptoms), len(lexicon.categories), path))
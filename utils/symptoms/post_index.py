@@ -0,0 +1,337 @@
+"""
+Inverted index from the symptoms and categories to the posts mentioning them
+
+The indicator matrices of the extraction (see cooccurrence.py) are kept in
+CSC form: the rows of the column of a symptom (or category) are the sorted
+ids of its posts. The ids are given to the posts in their order of arrival,
+next to two side columns, created_utc and the code of the subreddit. A query
+intersects or unites the posting arrays and filters them by time and
+subreddit without scanning the posts DataFrame.
+
+New posts are appended with add as a CSC segment of their own: the posting of
+a symptom is the concatenation of its columns in the segments, shifted by the
+first id of each segment. The last segments are merged as long as the one
+before is not larger, like the carries of a binary counter, so that there are
+O(log n) segments and each post is merged O(log n) times. The index is saved to
+and loaded from a single .npz file.
+
+Ex.:
+index = PostIndex(lexicon.symptoms.tolist(), lexicon.categories.tolist(), lexicon.symptom_category)
+X, _ = extractor.indicator_matrix(df.clean_text, lexicon.symptoms.tolist())
+index.add(X, df.created_utc, df.subreddit, keys=df.id)
+index.save("post_index.npz")
+
+# posts mentioning brain fog in r/covidlonghaulers during 2021
+posts = index.query(symptoms=["clouded consciousness"], subreddits=["covidlonghaulers"],
+                    start="2021-01-01", end="2022-01-01")
+index.keys[posts]
+"""
+
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy import sparse
+
+from cooccurrence import category_matrix
+
+# version of the file format
+INDEX_VERSION = 2
+
+
+def intersect_sorted(a, b):
+    """ Return the sorted values of both sorted arrays of unique values """
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    # binary search of the values of the smaller array in the larger one
+    positions = np.searchsorted(b, a)
+    positions[positions == len(b)] = 0
+    return a[b[positions] == a]
+
+
+def union_sorted(arrays):
+    """ Return the sorted values of any of the sorted arrays """
+    arrays = [array for array in arrays if len(array)]
+    if not arrays:
+        return np.zeros(0, dtype=np.int64)
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.unique(np.concatenate(arrays))
+
+
+def to_timestamp(value):
+    """
+        Return the unix time in seconds of a number, a date string, a datetime
+        or a datetime64, the naive datetimes being in UTC like created_utc
+    """
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if hasattr(value, "timestamp"):  # datetime, pandas Timestamp
+        return int(value.timestamp())
+    return int(np.datetime64(value, "s").astype(np.int64))
+
+
+class PostIndex:
+    """
+        Parameters
+        -------------------------------------------------------
+        symptoms :         labels of the symptom ids (columns of the symptom matrices)
+        categories :       labels of the category ids
+        symptom_category : category id of each symptom, -1 if it has none, used to
+                           index the categories of the added posts
+    """
+
+    def __init__(self, symptoms, categories=None, symptom_category=None):
+        self.symptom_labels = list(symptoms)
+        self.category_labels = list(categories or [])
+        self.symptom_category = None if symptom_category is None else np.asarray(symptom_category)
+        self._symptom_ids = {label: i for i, label in enumerate(self.symptom_labels)}
+        self._category_ids = {label: i for i, label in enumerate(self.category_labels)}
+
+        # side columns, one value per post
+        self.created_utc = np.zeros(0, dtype=np.int64)
+        self.subreddit_codes = np.zeros(0, dtype=np.int32)
+        self.subreddits = []
+        self._subreddit_codes = {}
+        self.keys = np.zeros(0, dtype=object)
+
+        # postings in CSC segments (first post id, symptoms, categories), in the order of the ids
+        self._segments = []
+        # whether the posts were added in increasing created_utc
+        self.time_sorted = True
+
+    def __len__(self):
+        return len(self.created_utc)
+
+    def add(self, X_symptoms, created_utc, subreddits, X_categories=None, keys=None):
+        """
+            Append posts to the index, their ids following the ones of the posts already indexed
+
+            Parameters
+            -------------------------------------------------------
+            X_symptoms :   indicator matrix posts x symptoms, ex. of SymptomExtractor.indicator_matrix
+            created_utc :  creation time of each post (unix seconds)
+            subreddits :   subreddit of each post
+            X_categories : indicator matrix posts x categories. Default: computed
+                           from symptom_category if given
+            keys :         identifiers of the posts (ex. reddit ids), kept in self.keys
+
+            Return
+            -------------------------------------------------------------
+            array of the ids of the added posts
+        """
+        X_symptoms = sparse.csr_matrix(X_symptoms)
+        created_utc = np.asarray(created_utc, dtype=np.int64)
+        n_posts = X_symptoms.shape[0]
+        if X_symptoms.shape[1] != len(self.symptom_labels):
+            raise ValueError("Number of symptoms {} not defined!".format(X_symptoms.shape[1]))
+        if len(created_utc) != n_posts:
+            raise ValueError("Number of created_utc {} not defined for {} posts!".format(len(created_utc), n_posts))
+
+        if X_categories is None:
+            if self.symptom_category is not None:
+                X_categories = category_matrix(X_symptoms, self.symptom_category, len(self.category_labels))
+            else:
+                X_categories = sparse.csr_matrix((n_posts, len(self.category_labels)), dtype=np.int8)
+        X_categories = sparse.csr_matrix(X_categories)
+
+        codes = np.fromiter((self._subreddit_code(subreddit) for subreddit in subreddits),
+                            dtype=np.int32, count=n_posts)
+        if keys is None:
+            keys = [None] * n_posts
+        keys = np.fromiter(keys, dtype=object, count=n_posts)
+
+        ids = np.arange(len(self), len(self) + n_posts)
+        if n_posts:
+            self._add_segment(len(self), X_symptoms.astype(np.int8).tocsc(), X_categories.astype(np.int8).tocsc())
+        if len(created_utc):
+            self.time_sorted = self.time_sorted and bool(np.all(np.diff(created_utc) >= 0)) and \
+                (not len(self) or created_utc[0] >= self.created_utc[-1])
+        self.created_utc = np.concatenate([self.created_utc, created_utc])
+        self.subreddit_codes = np.concatenate([self.subreddit_codes, codes])
+        self.keys = np.concatenate([self.keys, keys])
+        return ids
+
+    def _subreddit_code(self, subreddit):
+        code = self._subreddit_codes.get(subreddit)
+        if code is None:
+            code = self._subreddit_codes[subreddit] = len(self.subreddits)
+            self.subreddits.append(subreddit)
+        return code
+
+    def _add_segment(self, first_id, symptoms, categories):
+        """ Append the CSC postings of new posts, merging the last segments while the one before is not larger """
+        symptoms.sort_indices()
+        categories.sort_indices()
+        segments = self._segments
+        segments.append((first_id, symptoms, categories))
+        while len(segments) > 1 and segments[-2][1].shape[0] <= segments[-1][1].shape[0]:
+            _, last_symptoms, last_categories = segments.pop()
+            first_id, symptoms, categories = segments[-1]
+            symptoms = sparse.vstack([symptoms, last_symptoms], format="csc")
+            categories = sparse.vstack([categories, last_categories], format="csc")
+            symptoms.sort_indices()
+            categories.sort_indices()
+            segments[-1] = (first_id, symptoms, categories)
+
+    def _postings(self, matrix):
+        """ Return the CSC postings of all the posts, matrix 1 for the symptoms, 2 for the categories """
+        n_columns = len(self.symptom_labels if matrix == 1 else self.category_labels)
+        if not self._segments:
+            return sparse.csc_matrix((0, n_columns), dtype=np.int8)
+        postings = sparse.vstack([segment[matrix] for segment in self._segments], format="csc")
+        postings.sort_indices()
+        return postings
+
+    @property
+    def symptom_postings(self):
+        """ CSC matrix posts x symptoms of all the segments """
+        return self._postings(1)
+
+    @property
+    def category_postings(self):
+        """ CSC matrix posts x categories of all the segments """
+        return self._postings(2)
+
+    def _column(self, matrix, column):
+        """ Return the sorted ids of the posts of a column, concatenated over the segments """
+        posts = []
+        for segment in self._segments:
+            postings = segment[matrix]
+            posts.append(postings.indices[postings.indptr[column]:postings.indptr[column + 1]] + segment[0])
+        if not posts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(posts).astype(np.int64)
+
+    def symptom_posts(self, symptom):
+        """ Return the sorted ids of the posts mentioning a symptom (label or id) """
+        return self._column(1, self._id(symptom, self._symptom_ids, "Symptom"))
+
+    def category_posts(self, category):
+        """ Return the sorted ids of the posts mentioning a symptom of the category (label or id) """
+        return self._column(2, self._id(category, self._category_ids, "Category"))
+
+    @staticmethod
+    def _id(value, ids, kind):
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        if value not in ids:
+            raise ValueError("{} {} not defined!".format(kind, value))
+        return ids[value]
+
+    def time_range(self, start=None, end=None):
+        """ Return the sorted ids of the posts created in [start, end), see to_timestamp """
+        low = -np.inf if start is None else to_timestamp(start)
+        high = np.inf if end is None else to_timestamp(end)
+        if self.time_sorted:
+            return np.arange(np.searchsorted(self.created_utc, low, "left"),
+                             np.searchsorted(self.created_utc, high, "left"))
+        return np.flatnonzero((self.created_utc >= low) & (self.created_utc < high))
+
+    def filter(self, posts, subreddits=None, start=None, end=None):
+        """ Keep the posts of the given subreddits (name or list of names) created in [start, end) """
+        if isinstance(subreddits, str):
+            subreddits = [subreddits]
+        if subreddits is not None:
+            codes = [self._subreddit_codes[subreddit] for subreddit in subreddits
+                     if subreddit in self._subreddit_codes]
+            posts = posts[np.isin(self.subreddit_codes[posts], codes)]
+        if start is not None:
+            posts = posts[self.created_utc[posts] >= to_timestamp(start)]
+        if end is not None:
+            posts = posts[self.created_utc[posts] < to_timestamp(end)]
+        return posts
+
+    def query(self, symptoms=None, categories=None, mode="all", subreddits=None, start=None, end=None):
+        """
+            Return the sorted ids of the posts mentioning the given symptoms and
+            categories (labels or ids), from the given subreddits and created in [start, end)
+
+            mode : ("all", "any")
+                   if "all" : posts mentioning all the symptoms and categories
+                   if "any" : posts mentioning at least one of them
+            Without symptoms and categories, all the posts are filtered. A single
+            symptom, category or subreddit can be given without a list
+        """
+        if mode not in ("all", "any"):
+            raise ValueError("mode {} not defined!".format(mode))
+        if isinstance(symptoms, (str, int, np.integer)):
+            symptoms = [symptoms]
+        if isinstance(categories, (str, int, np.integer)):
+            categories = [categories]
+
+        postings = [self.symptom_posts(symptom) for symptom in symptoms or []] + \
+                   [self.category_posts(category) for category in categories or []]
+        if not postings:
+            posts = self.time_range(start, end)
+            return self.filter(posts, subreddits)
+
+        if mode == "all":
+            # the smallest posting first, the intersection can only shrink
+            postings.sort(key=len)
+            posts = postings[0]
+            for posting in postings[1:]:
+                posts = intersect_sorted(posts, posting)
+        else:
+            posts = union_sorted(postings)
+        return self.filter(posts, subreddits, start, end)
+
+    def save(self, path):
+        """
+            Write the index to a .npz file, replacing the previous file at once
+
+            The keys are saved with their numpy dtype and the mask of the missing
+            ones, so they must all be of the same type (ex. all str or all int)
+        """
+        present = np.array([key is not None for key in self.keys], dtype=bool)
+        key_types = sorted({type(key).__name__ for key in self.keys[present]})
+        if len(key_types) > 1:
+            raise ValueError("Keys of types {} not defined!".format(key_types))
+        key_values = np.array(self.keys[present].tolist())
+        arrays = {"version": np.array(INDEX_VERSION),
+                  "symptom_labels": np.array(self.symptom_labels, dtype=str),
+                  "category_labels": np.array(self.category_labels, dtype=str),
+                  "created_utc": self.created_utc,
+                  "subreddit_codes": self.subreddit_codes,
+                  "subreddits": np.array(self.subreddits, dtype=str),
+                  "keys": key_values,
+                  "keys_present": present}
+        if self.symptom_category is not None:
+            arrays["symptom_category"] = self.symptom_category
+        # the segments are merged into one
+        for name, postings in (("symptom", self.symptom_postings), ("category", self.category_postings)):
+            arrays[name + "_indptr"] = postings.indptr
+            arrays[name + "_indices"] = postings.indices
+
+        tmp_path = "{}.{}.tmp.npz".format(path, os.getpid())
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """ Read an index written by save, new posts can be added to it """
+        with np.load(path) as f:
+            if int(f["version"]) != INDEX_VERSION:
+                raise ValueError("Post index version {} not supported!".format(int(f["version"])))
+            index = cls(f["symptom_labels"].tolist(), f["category_labels"].tolist(),
+                        f["symptom_category"] if "symptom_category" in f else None)
+            index.created_utc = f["created_utc"]
+            index.subreddit_codes = f["subreddit_codes"]
+            for subreddit in f["subreddits"].tolist():
+                index._subreddit_code(subreddit)
+            n_posts = len(index.created_utc)
+            index.keys = np.full(n_posts, None, dtype=object)
+            index.keys[f["keys_present"]] = f["keys"].tolist()
+            postings = []
+            for name, labels in (("symptom", index.symptom_labels), ("category", index.category_labels)):
+                indptr, indices = f[name + "_indptr"], f[name + "_indices"]
+                postings.append(sparse.csc_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                                                  shape=(n_posts, len(labels))))
+            if n_posts:
+                index._segments = [(0,) + tuple(postings)]
+        index.time_sorted = bool(np.all(np.diff(index.created_utc) >= 0))
+        return index
@@ -0,0 +1,247 @@
+"""
+Materialized cube of the symptom counts per time bucket and subreddit
+
+The trend charts regroup the extracted symptoms by month, subreddit and
+category. SymptomCube holds the counts once, as a dense array
+time bucket x subreddit x column (symptoms, or categories with the category
+matrix, see cooccurrence.py) with the number of posts of each bucket and
+subreddit next to it. It is built in one np.bincount over the non-zero entries
+of the indicator matrix, updated the same way when new posts are added (ex. a
+new collection day), and coarser buckets are summed from the finer ones.
+
+The buckets are numpy datetime64 units ("D" day, "W" week, "M" month, "Y"
+year; numpy weeks start on Thursday) covering a continuous range of dates.
+
+Ex.:
+cube = SymptomCube(lexicon.symptoms.tolist(), unit="D")
+cube.add(X, df.created_utc, df.subreddit)
+cube.add(X_new_day, df_new_day.created_utc, df_new_day.subreddit)
+
+monthly = cube.resample("M")
+labels, counts = monthly.series(["fatigue", "clouded consciousness"], subreddits=["covidlonghaulers"])
+monthly.to_frame(["fatigue"], normalize=True)   # share of the posts of each month
+
+# the same cube of the categories
+category_cube = SymptomCube(lexicon.categories.tolist())
+category_cube.add(category_matrix(X, lexicon.symptom_category, len(lexicon.categories)),
+                  df.created_utc, df.subreddit)
+"""
+
+import os
+
+import numpy as np
+from scipy import sparse
+
+# version of the file format
+CUBE_VERSION = 1
+
+UNITS = ("D", "W", "M", "Y")
+
+# units each unit can be resampled to, the coarser buckets holding whole finer ones
+# (a week can span two months or two years)
+NESTED_UNITS = {"D": ("D", "W", "M", "Y"), "W": ("W",), "M": ("M", "Y"), "Y": ("Y",)}
+
+
+def _distance(first, last):
+    """ Return the number of buckets from first to last, datetime64 of the same unit """
+    return int((last - first).astype(np.int64))
+
+
+class SymptomCube:
+    """
+        Parameters
+        -------------------------------------------------------
+        columns : labels of the columns of the indicator matrices (symptoms or categories)
+        unit :    time bucket ("D", "W", "M", "Y")
+    """
+
+    def __init__(self, columns, unit="D"):
+        if unit not in UNITS:
+            raise ValueError("unit {} not defined!".format(unit))
+        self.columns = list(columns)
+        self._column_ids = {label: i for i, label in enumerate(self.columns)}
+        self.unit = unit
+        self.subreddits = []
+        self._subreddit_codes = {}
+        # first bucket, None while the cube is empty
+        self.start = None
+        self.counts = np.zeros((0, 0, len(self.columns)), dtype=np.int64)
+        self.posts = np.zeros((0, 0), dtype=np.int64)
+
+    @property
+    def labels(self):
+        """ datetime64 labels of the time buckets """
+        if self.start is None:
+            return np.zeros(0, dtype="datetime64[{}]".format(self.unit))
+        return self.start + np.arange(self.counts.shape[0])
+
+    def buckets(self, created_utc):
+        """ Return the datetime64 bucket of each unix time """
+        return np.asarray(created_utc, dtype=np.int64).astype("datetime64[s]").astype(
+            "datetime64[{}]".format(self.unit))
+
+    def _subreddit_code(self, subreddit):
+        code = self._subreddit_codes.get(subreddit)
+        if code is None:
+            code = self._subreddit_codes[subreddit] = len(self.subreddits)
+            self.subreddits.append(subreddit)
+        return code
+
+    def _extend(self, first, last, n_subreddits):
+        """ Pad the arrays with empty buckets and subreddits to cover [first, last] """
+        if self.start is None:
+            self.start = first
+            before, after = 0, _distance(first, last) + 1
+        else:
+            end = self.start + self.counts.shape[0] - 1
+            before = max(_distance(first, self.start), 0)
+            after = max(_distance(end, last), 0)
+            self.start = min(self.start, first)
+        more_subreddits = n_subreddits - self.counts.shape[1]
+        if before or after or more_subreddits:
+            self.counts = np.pad(self.counts, ((before, after), (0, more_subreddits), (0, 0)))
+            self.posts = np.pad(self.posts, ((before, after), (0, more_subreddits)))
+
+    def add(self, X, created_utc, subreddits):
+        """
+            Add the counts of new posts
+
+            Parameters
+            -------------------------------------------------------
+            X :           indicator matrix posts x columns, ex. of SymptomExtractor.indicator_matrix
+            created_utc : creation time of each post (unix seconds)
+            subreddits :  subreddit of each post
+        """
+        X = sparse.csr_matrix(X)
+        if X.shape[1] != len(self.columns):
+            raise ValueError("Number of columns {} not defined!".format(X.shape[1]))
+        if X.shape[0] == 0:
+            return
+        buckets = self.buckets(created_utc)
+        codes = np.fromiter((self._subreddit_code(subreddit) for subreddit in subreddits),
+                            dtype=np.int64, count=X.shape[0])
+        self._extend(buckets.min(), buckets.max(), len(self.subreddits))
+
+        n_subreddits, n_columns = self.counts.shape[1:]
+        # only the buckets of the new posts are counted, added to a view of the cube
+        rows = (buckets - self.start).astype(np.int64)
+        first = rows.min()
+        rows -= first
+        posts = self.posts[first:first + rows.max() + 1]
+        counts = self.counts[first:first + rows.max() + 1]
+        # flat index of the cell (bucket, subreddit) of each post in these buckets
+        cells = rows * n_subreddits + codes
+        posts += np.bincount(cells, minlength=posts.size).reshape(posts.shape)
+
+        entries = X.tocoo()
+        counts += np.bincount(cells[entries.row] * n_columns + entries.col,
+                              minlength=counts.size).reshape(counts.shape)
+
+    def resample(self, unit):
+        """ Return the cube with coarser time buckets, ex. "M" for a daily cube, see NESTED_UNITS """
+        if unit not in UNITS:
+            raise ValueError("unit {} not defined!".format(unit))
+        if unit not in NESTED_UNITS[self.unit]:
+            raise ValueError("Resampling from unit {} to unit {} not defined!".format(self.unit, unit))
+        cube = SymptomCube(self.columns, unit)
+        cube.subreddits = list(self.subreddits)
+        cube._subreddit_codes = dict(self._subreddit_codes)
+        if self.start is None:
+            cube.counts = np.zeros((0,) + self.counts.shape[1:], dtype=np.int64)
+            cube.posts = np.zeros((0,) + self.posts.shape[1:], dtype=np.int64)
+            return cube
+
+        # the buckets are sorted, each coarser bucket sums a run of them
+        labels = self.labels.astype("datetime64[{}]".format(unit))
+        first = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]]))
+        cube.start = labels[0]
+        coarse_labels = labels[first]
+        # position of each coarser bucket from the first one
+        positions = (coarse_labels - cube.start).astype(np.int64)
+        n_buckets = int(positions[-1]) + 1
+        cube.counts = np.zeros((n_buckets,) + self.counts.shape[1:], dtype=np.int64)
+        cube.posts = np.zeros((n_buckets,) + self.posts.shape[1:], dtype=np.int64)
+        cube.counts[positions] = np.add.reduceat(self.counts, first, axis=0)
+        cube.posts[positions] = np.add.reduceat(self.posts, first, axis=0)
+        return cube
+
+    def _select(self, columns, subreddits, start, end):
+        """ Return the bucket slice, subreddit codes and column ids of a query """
+        if isinstance(columns, str):
+            columns = [columns]
+        if isinstance(subreddits, str):
+            subreddits = [subreddits]
+        if columns is None:
+            column_ids = np.arange(len(self.columns))
+        else:
+            column_ids = []
+            for column in columns:
+                if column not in self._column_ids:
+                    raise ValueError("Column {} not defined!".format(column))
+                column_ids.append(self._column_ids[column])
+        if subreddits is None:
+            codes = np.arange(len(self.subreddits))
+        else:
+            codes = [self._subreddit_codes[subreddit] for subreddit in subreddits
+                     if subreddit in self._subreddit_codes]
+
+        labels = self.labels
+        unit = "datetime64[{}]".format(self.unit)
+        first = 0 if start is None else int(np.searchsorted(labels, np.datetime64(start).astype(unit)))
+        last = len(labels) if end is None else int(np.searchsorted(labels, np.datetime64(end).astype(unit)))
+        return slice(first, last), codes, column_ids
+
+    def series(self, columns=None, subreddits=None, start=None, end=None, normalize=False):
+        """
+            Return the labels of the buckets in [start, end) and the counts of the
+            given columns in each bucket (buckets x columns), summed over the
+            given subreddits (default: all). A single column or subreddit can be
+            given without a list
+
+            normalize : if True, the counts are divided by the number of posts of the bucket
+        """
+        buckets, codes, column_ids = self._select(columns, subreddits, start, end)
+        counts = self.counts[buckets][:, codes][:, :, column_ids].sum(axis=1)
+        if normalize:
+            posts = self.posts[buckets][:, codes].sum(axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                counts = np.where(posts[:, np.newaxis] > 0, counts / posts[:, np.newaxis], 0.0)
+        return self.labels[buckets], counts
+
+    def totals(self, columns=None, subreddits=None, start=None, end=None):
+        """ Return the counts of the given columns over the buckets in [start, end) and the given subreddits """
+        buckets, codes, column_ids = self._select(columns, subreddits, start, end)
+        return self.counts[buckets][:, codes][:, :, column_ids].sum(axis=(0, 1))
+
+    def to_frame(self, columns=None, subreddits=None, start=None, end=None, normalize=False):
+        """ Return the series as a pandas DataFrame indexed by the buckets """
+        import pandas as pd
+
+        if isinstance(columns, str):
+            columns = [columns]
+        labels, counts = self.series(columns, subreddits, start, end, normalize)
+        return pd.DataFrame(counts, index=pd.Index(labels, name="bucket"),
+                            columns=self.columns if columns is None else list(columns))
+
+    def save(self, path):
+        """ Write the cube to a .npz file, replacing the previous file at once """
+        tmp_path = "{}.{}.tmp.npz".format(path, os.getpid())
+        np.savez(tmp_path, version=np.array(CUBE_VERSION), unit=np.array(self.unit),
+                 columns=np.array(self.columns, dtype=str), subreddits=np.array(self.subreddits, dtype=str),
+                 labels=self.labels, counts=self.counts, posts=self.posts)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """ Read a cube written by save, new posts can be added to it """
+        with np.load(path) as f:
+            if int(f["version"]) != CUBE_VERSION:
+                raise ValueError("Symptom cube version {} not supported!".format(int(f["version"])))
+            cube = cls(f["columns"].tolist(), str(f["unit"]))
+            for subreddit in f["subreddits"].tolist():
+                cube._subreddit_code(subreddit)
+            labels = f["labels"]
+            cube.start = labels[0] if len(labels) else None
+            cube.counts = f["counts"]
+            cube.posts = f["posts"]
+        return cube